@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+    Benchmarks for the pad build and render pipeline.
+
+    Each stage is timed over a number of iterations, and reported as JSON
+    with latency percentiles, throughput and peak memory. Results can be
+    saved and used as a baseline for later runs, in which case any stage
+    whose median latency has regressed by more than the tolerance causes a
+    non-zero exit.
+"""
+import sys, os, os.path, time, json, random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from libcrypclient import pad, utils, jsmin, cssmin, loadgen
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SIZES = [0, 1024, 10 * 1024, pad.PAD_SIZE_LIMIT, 10 * pad.PAD_SIZE_LIMIT]
+# Regressions smaller than this many seconds are ignored.
+MIN_REGRESSION = 0.00005
+
+
+def percentile(lst, p):
+    lst = sorted(lst)
+    if not lst:
+        return 0
+    i = int(round((len(lst) - 1) * p / 100.0))
+    return lst[i]
+
+
+def _status(key):
+    """
+        Returns a value from /proc/self/status, in bytes.
+    """
+    f = open("/proc/self/status")
+    try:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) * 1024
+    finally:
+        f.close()
+    raise IOError, "No %s in /proc/self/status"%key
+
+
+def peakmem(func):
+    """
+        Returns the peak memory in bytes used while running func, or None if
+        it can't be measured. Uses tracemalloc where it's available.
+        Otherwise func is run in a forked child whose peak resident set size
+        is reset through /proc/self/clear_refs (Linux only), and the growth
+        of the peak over the starting resident set size is reported, which is
+        much coarser. ru_maxrss can't be used for this, since the child
+        inherits the parent's high-water mark.
+    """
+    if tracemalloc:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    r, w = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(r)
+        try:
+            # Hand free heap memory back to the system first, or func could
+            # reuse it without the resident set size growing.
+            import ctypes
+            ctypes.CDLL(None).malloc_trim(0)
+            f = open("/proc/self/clear_refs", "w")
+            f.write("5")
+            f.close()
+            before = _status("VmRSS")
+            func()
+            os.write(w, str(max(0, _status("VmHWM") - before)))
+        except (IOError, OSError, ValueError, AttributeError, ImportError):
+            pass
+        os._exit(0)
+    os.close(w)
+    ret = os.read(r, 100)
+    os.close(r)
+    os.waitpid(pid, 0)
+    if not ret:
+        return None
+    return int(ret)
+
+
+def measure(func, size, iterations, memory=True):
+    """
+        Calls func iterations times, and returns a dictionary of statistics.
+        size is the number of input bytes processed per call, used for
+        throughput.
+    """
+    func()
+    times = []
+    for i in xrange(iterations):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    total = sum(times)
+    ret = dict(
+        iterations = iterations,
+        size = size,
+        mean = total/iterations,
+        p50 = percentile(times, 50),
+        p90 = percentile(times, 90),
+        p99 = percentile(times, 99),
+        max = max(times),
+        ops = iterations/total if total else 0,
+        throughput = size*iterations/total if total else 0,
+    )
+    if memory:
+        ret["peakmem"] = peakmem(func)
+    return ret
+
+
+class Bench:
+    def __init__(self, iterations, sizes, memory):
+        self.iterations, self.sizes, self.memory = iterations, sizes, memory
+        self.results = {}
+
+    def run(self, name, func, size, iterations=None):
+        print >> sys.stderr, "%s..."%name
+        self.results[name] = measure(
+            func, size, iterations or self.iterations, self.memory
+        )
+
+    def build(self):
+        jquery = utils.data.read("components/contrib/jquery-1.4.2.js")
+        reset = utils.data.read("components/contrib/resetfontsbase.css")
+        slow = max(1, self.iterations//20)
+        # Data caches in memory, so the cache is cleared on each call to time
+        # an actual file read.
+        data = utils.Data(utils.__name__)
+        def read():
+            data.cache.clear()
+            return data.read("components/contrib/jquery-1.4.2.js")
+        self.run("data.read", read, len(jquery))
+        self.run("snip", lambda: pad.snip(jquery, [(10, 20)]), len(jquery))
+        self.run("jsmin", lambda: jsmin.jsmin(jquery), len(jquery), slow)
+        self.run("cssmin", lambda: cssmin.cssmin(reset), len(reset))
+
+        app = pad._App()
+        jslibs, css = app.getComponents(pad.Pad.JSLIBS, pad.Pad.CSS, True)
+        template = utils.data.read("components/pad.html")
+        listinclusion = utils.data.read("components/list.html")
+        def bootstrap():
+            app.bootstrap(
+                template, jslibs, css,
+                domain = pad._App.DOMAINMARKER,
+                name = "@!name!@",
+                data = pad._App.CIPHERMARKER,
+                writekey = "@!writekey!@",
+                dev = False,
+                embed = False,
+                listinclusion = listinclusion,
+            )
+        size = sum(len(i) for i in jslibs + css)
+        self.run("bootstrap", bootstrap, size, slow)
+
+    def render(self):
+        p = pad.Pad("http://bench/", True, False)
+        c = pad.Converter("http://bench/", True, False)
+        e = pad.Pad("http://bench/", True, False, embed=True)
+        self.run("new", lambda: p.new("name", "a"*40), 0)
+        for size in self.sizes:
+            data = loadgen.ciphertext(size, random.Random(0))
+            page = p.existing("name", data)
+            self.run(
+                "jsquote/%s"%size, lambda: utils.jsquote(data), len(data)
+            )
+            self.run(
+                "dataquote/%s"%size, lambda: utils.dataquote(data), len(data)
+            )
+            self.run(
+                "existing/%s"%size, lambda: p.existing("name", data), len(data)
+            )
+            self.run(
+                "existing-embed/%s"%size, lambda: e.existing("name", data),
+                len(data)
+            )
+            self.run(
+                "render/%s"%size, lambda: c.render("name", data), len(data)
+            )
+            self.run(
+                "hash/%s"%size, lambda: pad.hash(page, True), len(page)
+            )
+
+
+def compare(results, baseline, tolerance, floor=MIN_REGRESSION):
+    """
+        Returns a list of (name, baseline, current) tuples for stages whose
+        median latency regressed by more than tolerance, relative to the
+        baseline, and by more than floor seconds. The floor keeps stages
+        that take microseconds from failing on noise.
+    """
+    ret = []
+    for name, base in sorted(baseline.items()):
+        cur = results.get(name)
+        if cur and cur["p50"] - base["p50"] > max(base["p50"] * tolerance, floor):
+            ret.append((name, base["p50"], cur["p50"]))
+    return ret
+
+
+def main():
+    from optparse import OptionParser
+    parser = OptionParser(
+                usage = "%prog [options]",
+                version="%prog 0.1",
+            )
+    parser.add_option(
+        "-i", "--iterations", type="int",
+        dest="iterations", default=200,
+        help = "Iterations per stage."
+    )
+    parser.add_option(
+        "-o", "--output", action="store", type="str",
+        dest="output", default=None,
+        help = "Write results to this file as well as stdout."
+    )
+    parser.add_option(
+        "-b", "--baseline", action="store", type="str",
+        dest="baseline", default=None,
+        help = "Compare against a saved baseline."
+    )
+    parser.add_option(
+        "-t", "--tolerance", type="float",
+        dest="tolerance", default=0.25,
+        help = "Allowed fractional slowdown against the baseline."
+    )
+    parser.add_option(
+        "-f", "--floor", type="float",
+        dest="floor", default=MIN_REGRESSION,
+        help = "Ignore slowdowns of fewer than this many seconds."
+    )
+    parser.add_option(
+        "-n", "--nomem", action="store_false",
+        dest="memory", default=True,
+        help = "Don't measure peak memory."
+    )
+    options, args = parser.parse_args()
+
+    b = Bench(options.iterations, SIZES, options.memory)
+    b.build()
+    b.render()
+    output = json.dumps(b.results, indent=4, sort_keys=True)
+    print output
+    if options.output:
+        f = open(options.output, "w")
+        f.write(output)
+        f.close()
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+        regressions = compare(
+            b.results, baseline, options.tolerance, options.floor
+        )
+        for name, base, cur in regressions:
+            change = "%+.0f%%"%((cur/base - 1) * 100) if base else "new"
+            print >> sys.stderr, "REGRESSION: %s p50 %.6fs -> %.6fs (%s)"%(
+                name, base, cur, change
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
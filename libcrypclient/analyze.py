@@ -0,0 +1,124 @@
+"""
+    Payload analysis for a built Pad or Converter: the raw, minified and
+    gzipped size of every inlined component, its share of the page, and
+    checks against byte budgets.
+"""
+import zlib
+import pad
+
+
+def gzipSize(s, level=6):
+    c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return len(c.compress(s) + c.flush())
+
+
+def analyze(app, page):
+    """
+        Returns a report dictionary for app, given a page rendered by it.
+        The report has a "components" list of dictionaries with name, kind,
+        raw, minified, gzip and share keys, and a "total" dictionary with
+        page, gzip, components, cssopt and other keys. For apps built without
+        minification, minified is the size as inlined. Cssopt is the number of
+        bytes saved by combining the stylesheets, if the app was built with
+        cssopt set.
+    """
+    if not app.sources:
+        raise ValueError, "No component sources to analyze."
+    specs = [("js", "%s.js"%i, e) for i, e in app.getJSLibs()]
+    specs += [("css", "%s.css"%i, []) for i in app.CSS]
+    components = []
+    for kind, name, exclusions in specs:
+        path = "components/" + name
+        raw = app.sources[path]
+        if app.minimized:
+            output = app.built[path][1]
+        elif kind == "js":
+            output = pad.snip(raw, exclusions)
+        else:
+            output = raw
+        components.append(dict(
+            name = name,
+            kind = kind,
+            raw = len(raw),
+            minified = len(output),
+            gzip = gzipSize(output),
+            share = float(len(output))/len(page),
+        ))
+    saved = 0
+    if app.cssreport:
+        saved = app.cssreport["before"] - app.cssreport["after"]
+    inlined = sum(i["minified"] for i in components) - saved
+    return dict(
+        components = components,
+        total = dict(
+            page = len(page),
+            gzip = gzipSize(page),
+            components = inlined,
+            cssopt = saved,
+            other = len(page) - inlined,
+        )
+    )
+
+
+def check(report, budgets):
+    """
+        Checks a report against a budgets dictionary, and returns a list of
+        messages describing the budgets that were exceeded. Budgets look like
+        this, with any of the report keys usable as limits:
+
+            {
+                "total": {"page": 250000, "gzip": 80000},
+                "components": {
+                    "contrib/jquery-1.4.2.js": {"minified": 75000}
+                }
+            }
+    """
+    ret = []
+    def checkOne(label, values, limits):
+        for k, limit in sorted(limits.items()):
+            if k not in values:
+                ret.append("%s: unknown budget key %s"%(label, k))
+            elif values[k] > limit:
+                ret.append(
+                    "%s: %s is %s bytes, over budget by %s"%(
+                        label, k, values[k], values[k] - limit
+                    )
+                )
+    checkOne("total", report["total"], budgets.get("total", {}))
+    components = dict((i["name"], i) for i in report["components"])
+    for name, limits in sorted(budgets.get("components", {}).items()):
+        if name not in components:
+            ret.append("%s: no such component"%name)
+        else:
+            checkOne(name, components[name], limits)
+    return ret
+
+
+def format(report):
+    """
+        Formats a report as a table.
+    """
+    ret = ["%-40s %4s %8s %8s %8s %7s"%(
+        "component", "kind", "raw", "minified", "gzip", "share"
+    )]
+    for i in report["components"]:
+        ret.append("%-40s %4s %8d %8d %8d %6.1f%%"%(
+            i["name"], i["kind"], i["raw"], i["minified"], i["gzip"],
+            i["share"] * 100
+        ))
+    t = report["total"]
+    if t["cssopt"]:
+        ret.append("%-40s %4s %8s %8d %8s %7s"%(
+            "(cssopt)", "", "", -t["cssopt"], "", ""
+        ))
+    ret.append("%-40s %4s %8s %8d %8s %6.1f%%"%(
+        "(components)", "", "", t["components"], "",
+        100.0 * t["components"] / t["page"]
+    ))
+    ret.append("%-40s %4s %8s %8d %8s %6.1f%%"%(
+        "(template)", "", "", t["other"], "", 100.0 * t["other"] / t["page"]
+    ))
+    ret.append("%-40s %4s %8s %8d %8d %7s"%(
+        "page", "", "", t["page"], t["gzip"], ""
+    ))
+    return "\n".join(ret)
@@ -0,0 +1,367 @@
+"""
+    A local reference backend for cryp.sr, standing in for the hosted service
+    when profiling the full read and save cycle offline.
+
+    GET /name serves the existing pad called name, or a new pad with a fresh
+    write key if there is none. POST /_save takes name, key and data form
+    fields, as sent by pad.js and converter.js, and replies "OK" on success.
+    The first save of a pad sets its write key; later saves must present the
+    same key. Ciphertexts over pad.PAD_SIZE_LIMIT bytes are refused.
+
+    Connections are HTTP/1.1 keep-alive, and are handled by a fixed pool of
+    worker threads, which also do the rendering. Accepted connections queue
+    up for a free worker, and the listener stops accepting when the queue is
+    full, so the number of requests in flight is bounded.
+"""
+import BaseHTTPServer, Queue, threading, socket, urllib, urlparse
+import os, os.path, hashlib, tempfile
+import pad
+
+WRITEKEY_LENGTH = 40
+# Form encoding can triple the size of a ciphertext.
+BODY_LIMIT = pad.PAD_SIZE_LIMIT * 3 + 4096
+
+
+def keyHash(writekey):
+    return hashlib.sha256(writekey).hexdigest()
+
+
+def accepts(header, encoding):
+    """
+        Returns True if the value of an Accept-Encoding header allows
+        encoding: it's listed, or covered by "*", with a non-zero q-value.
+    """
+    if not header:
+        return False
+    qvalues = {}
+    for i in header.split(","):
+        params = i.split(";")
+        q = 1.0
+        for p in params[1:]:
+            k, _, v = p.partition("=")
+            if k.strip().lower() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        qvalues[params[0].strip().lower()] = q
+    if encoding in qvalues:
+        return qvalues[encoding] > 0
+    return qvalues.get("*", 0) > 0
+
+
+class Store:
+    """
+        Base class for pad stores. Subclasses provide the storage:
+
+            _get(name)                  returns a (keyhash, data) tuple, or
+                                        None if there's no such pad
+            _put(name, keyhash, data)   stores a pad, replacing any previous
+                                        version
+
+        The write key check is done here, under a lock, so that two saves
+        can't both claim a new pad. _get and _put are only called with the
+        lock held, apart from _get from load.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def load(self, name):
+        """
+            Returns the ciphertext of pad name, or None if it doesn't exist.
+        """
+        ret = self._get(name)
+        if ret is None:
+            return None
+        return ret[1]
+
+    def save(self, name, writekey, data):
+        """
+            Saves a ciphertext. Returns False if the pad exists and writekey
+            isn't its write key.
+        """
+        h = keyHash(writekey)
+        self.lock.acquire()
+        try:
+            current = self._get(name)
+            if current is not None and current[0] != h:
+                return False
+            self._put(name, h, data)
+            return True
+        finally:
+            self.lock.release()
+
+
+class MemoryStore(Store):
+    def __init__(self):
+        Store.__init__(self)
+        self.pads = {}
+
+    def _get(self, name):
+        return self.pads.get(name)
+
+    def _put(self, name, keyhash, data):
+        self.pads[name] = (keyhash, data)
+
+
+class FileStore(Store):
+    """
+        Stores each pad in a file in a directory, named after the SHA256 hash
+        of the pad name. Files are replaced atomically.
+    """
+    def __init__(self, directory):
+        Store.__init__(self)
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, name):
+        return os.path.join(self.directory, hashlib.sha256(name).hexdigest())
+
+    def _get(self, name):
+        try:
+            f = open(self._path(name), "rb")
+        except IOError:
+            return None
+        try:
+            keyhash, data = f.read().split("\n", 1)
+        finally:
+            f.close()
+        return keyhash, data
+
+    def _put(self, name, keyhash, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+        try:
+            f = os.fdopen(fd, "wb")
+            try:
+                f.write(keyhash + "\n")
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmp, self._path(name))
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "crypsr-reference/0.1"
+
+    def setup(self):
+        self.timeout = self.server.backend.idle
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        self.server.backend.get(self)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        self.server.backend.post(self)
+
+    def log_message(self, *args):
+        if self.server.backend.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, *args)
+
+    def respond(self, code, body, headers=()):
+        """
+            Sends a response. A 304 has no body, so it's sent without
+            Content-Type or Content-Length.
+        """
+        self.send_response(code)
+        for k, v in headers:
+            if code != 304 or k != "Content-Type":
+                self.send_header(k, v)
+        if code != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD" and code != 304:
+            self.wfile.write(body)
+
+
+class _Server(BaseHTTPServer.HTTPServer):
+    """
+        Hands accepted connections to a pool of worker threads through a
+        bounded queue.
+    """
+    def __init__(self, address, backend):
+        self.backend = backend
+        self.queue = Queue.Queue(backend.backlog)
+        BaseHTTPServer.HTTPServer.__init__(self, address, _Handler)
+        self.threads = []
+        for i in range(backend.workers):
+            t = threading.Thread(target=self.work)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def process_request(self, request, client_address):
+        self.queue.put((request, client_address))
+
+    def work(self):
+        while 1:
+            item = self.queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except (socket.error, socket.timeout):
+                pass
+            except Exception:
+                self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def stop(self, serving):
+        if serving:
+            self.shutdown()
+        for i in self.threads:
+            self.queue.put(None)
+        for i in self.threads:
+            i.join()
+        self.server_close()
+
+
+class Backend:
+    """
+        The reference backend. If app is given, it's a Pad to serve, which
+        is rebound to the backend's own domain with withDomain; otherwise one
+        is built. Port 0 picks a free port.
+    """
+    def __init__(self, store, host="127.0.0.1", port=0, app=None,
+                 workers=8, backlog=64, idle=15, verbose=False):
+        self.store = store
+        self.workers, self.backlog = workers, backlog
+        self.idle, self.verbose = idle, verbose
+        self.httpd = _Server((host, port), self)
+        self.port = self.httpd.server_address[1]
+        self.domain = "http://%s:%s/"%(host, self.port)
+        if app is None:
+            app = pad.Pad(self.domain, True, False)
+        self.pad = app.withDomain(self.domain)
+        self.thread = None
+        self.serving = False
+
+    def serve(self):
+        """
+            Serves requests until stop is called.
+        """
+        self.serving = True
+        self.httpd.serve_forever()
+
+    def start(self):
+        """
+            Serves requests from a background thread.
+        """
+        self.serving = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.stop(self.serving)
+        if self.thread:
+            self.thread.join()
+
+    def get(self, h):
+        name = urllib.unquote(urlparse.urlsplit(h.path).path[1:])
+        if not name or name.startswith("_"):
+            return h.respond(404, "Not found.", [("Content-Type", "text/plain")])
+        headers = [
+            ("Content-Type", "text/html; charset=utf-8"),
+            ("Cache-Control", "no-cache"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        data = self.store.load(name)
+        if data is None:
+            writekey = os.urandom(WRITEKEY_LENGTH/2).encode("hex")
+            headers[1] = ("Cache-Control", "no-store")
+            return h.respond(200, self.pad.new(name, writekey), headers)
+        encoding = None
+        if accepts(h.headers.get("Accept-Encoding"), "gzip"):
+            encoding = "gzip"
+        etag = self.pad.etag(name, data, encoding)
+        headers.append(("ETag", etag))
+        if pad.notModified(etag, h.headers.get("If-None-Match")):
+            return h.respond(304, "", headers)
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+            page = self.pad.compress_existing(name, data, encoding)
+        else:
+            page = self.pad.existing(name, data)
+        h.respond(200, page, headers)
+
+    def post(self, h):
+        def reply(code, msg):
+            h.respond(code, msg, [("Content-Type", "text/plain")])
+        if urlparse.urlsplit(h.path).path != "/_save":
+            return reply(404, "Not found.")
+        try:
+            size = int(h.headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            size = -1
+        if size < 0:
+            h.close_connection = 1
+            return reply(400, "Error: bad Content-Length.")
+        if size > BODY_LIMIT:
+            h.close_connection = 1
+            return reply(413, "Error: pad too large.")
+        form = urlparse.parse_qs(h.rfile.read(size), keep_blank_values=True)
+        name, key, data = [form.get(i, [None])[0] for i in ("name", "key", "data")]
+        if not name or name.startswith("_") or data is None:
+            return reply(400, "Error: bad request.")
+        if not key or len(key) != WRITEKEY_LENGTH:
+            return reply(403, "Error: bad write key.")
+        if len(data) > pad.PAD_SIZE_LIMIT:
+            return reply(413, "Error: pad too large.")
+        if not self.store.save(name, key, data):
+            return reply(403, "Error: bad write key.")
+        reply(200, "OK")
+
+
+def main():
+    from optparse import OptionParser
+    parser = OptionParser(
+                usage = "%prog [options]",
+                version="%prog 0.1",
+            )
+    parser.add_option(
+        "-p", "--port", type="int",
+        dest="port", default=8000,
+        help = "Port to listen on."
+    )
+    parser.add_option(
+        "-s", "--store", action="store", type="str",
+        dest="store", default=None,
+        help = "Keep pads in this directory, rather than in memory."
+    )
+    parser.add_option(
+        "-w", "--workers", type="int",
+        dest="workers", default=8,
+        help = "Number of worker threads."
+    )
+    parser.add_option(
+        "-v", "--verbose", action="store_true",
+        dest="verbose", default=False,
+        help = "Log requests."
+    )
+    options, args = parser.parse_args()
+    if options.store:
+        store = FileStore(options.store)
+    else:
+        store = MemoryStore()
+    b = Backend(
+        store, port=options.port, workers=options.workers,
+        verbose=options.verbose
+    )
+    print "Serving on %s"%b.domain
+    try:
+        b.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+    Compiled bundles: the static segments and slot layout of a compiled
+    Pad or Converter, written once at build time and loaded by workers
+    without minifying or bootstrapping anything.
+
+    A bundle is a magic string, a version, the length of a JSON metadata
+    block, the metadata itself, and then the static segments back to back.
+    Nothing in this module imports the minifiers.
+"""
+import os, os.path, json, mmap, struct, tempfile
+
+MAGIC = "CRYPSRBUNDLE"
+VERSION = 1
+_HEADER = struct.Struct(">II")
+
+
+def write(path, meta, segments):
+    """
+        Writes a bundle atomically. Meta is a JSON-serialisable dictionary;
+        the segment lengths are added to it as "segments".
+    """
+    meta = dict(meta)
+    meta["segments"] = [len(i) for i in segments]
+    header = json.dumps(meta, sort_keys=True)
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".tmp")
+    try:
+        f = os.fdopen(fd, "wb")
+        try:
+            f.write(MAGIC)
+            f.write(_HEADER.pack(VERSION, len(header)))
+            f.write(header)
+            f.writelines(segments)
+        finally:
+            f.close()
+        os.chmod(tmp, 0644)
+        os.rename(tmp, path)
+    except:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def load(path):
+    """
+        Maps a bundle into memory, and returns a (meta, segments) tuple.
+
+        Raises ValueError if the file isn't a bundle of this version.
+    """
+    f = open(path, "rb")
+    try:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        pos = len(MAGIC) + _HEADER.size
+        if m[:len(MAGIC)] != MAGIC:
+            raise ValueError, "Not a bundle: %s"%path
+        version, size = _HEADER.unpack(m[len(MAGIC):pos])
+        if version != VERSION:
+            raise ValueError, "Unsupported bundle version: %s"%version
+        meta = json.loads(m[pos:pos+size])
+        pos += size
+        segments = []
+        for i in meta["segments"]:
+            segments.append(m[pos:pos+i])
+            pos += i
+        if pos != len(m):
+            raise ValueError, "Truncated bundle: %s"%path
+    finally:
+        m.close()
+    return meta, segments
@@ -0,0 +1,15 @@
+/* Read data embedded by the server in an inert data block: "raw:" followed
+   by the data itself, or "base64:" followed by its UTF-8 encoding. Only
+   included in pages built with embed set. */
+function embeddedData(id){
+    var text = document.getElementById(id).text;
+    if (text.slice(0, 7) == "base64:") {
+        text = window.atob(text.slice(7));
+        try {
+            return decodeURIComponent(escape(text));
+        } catch (e) {
+            return text;
+        }
+    }
+    return text.slice(4);
+}
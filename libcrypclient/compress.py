@@ -0,0 +1,143 @@
+"""
+    Splicing precompressed static segments and freshly compressed dynamic
+    values into a single gzip or zlib ("deflate") stream.
+
+    Each piece is compressed with its own raw deflate compressor and ended
+    with a sync flush, so it's a byte-aligned run of non-final blocks that
+    only refers back into itself. Such runs can be concatenated freely, and
+    the stream is terminated with an empty final block. The checksums of the
+    whole page are built up from per-piece checksums using the zlib
+    crc32_combine and adler32_combine algorithms, so static segments never
+    have to be re-read per request.
+"""
+import zlib, struct
+
+GZIP_HEADER = "\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# An empty, final, fixed-Huffman deflate block.
+FINAL_BLOCK = "\x03\x00"
+ADLER_BASE = 65521
+
+
+def _gf2Times(mat, vec):
+    s = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            s ^= mat[i]
+        vec >>= 1
+        i += 1
+    return s
+
+
+def _gf2Square(mat):
+    return [_gf2Times(mat, i) for i in mat]
+
+
+def crc32Shift(length):
+    """
+        Returns the GF(2) operator that advances a CRC32 over length zero
+        bytes, for use with crc32Combine.
+    """
+    odd = [0xedb88320] + [1 << n for n in range(31)]
+    even = _gf2Square(odd)
+    odd = _gf2Square(even)
+    ret = [1 << n for n in range(32)]
+    while length:
+        even = _gf2Square(odd)
+        if length & 1:
+            ret = [_gf2Times(even, i) for i in ret]
+        length >>= 1
+        if not length:
+            break
+        odd = _gf2Square(even)
+        if length & 1:
+            ret = [_gf2Times(odd, i) for i in ret]
+        length >>= 1
+    return ret
+
+
+def crc32Combine(crc1, crc2, shift):
+    """
+        Returns the CRC32 of A + B, given the CRC32 of A, the CRC32 of B, and
+        crc32Shift(len(B)).
+    """
+    return _gf2Times(shift, crc1) ^ crc2
+
+
+def adler32Combine(adler1, adler2, len2):
+    """
+        Returns the Adler32 of A + B, given the Adler32 of A, the Adler32 of
+        B, and len(B).
+    """
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xffff) + ADLER_BASE - 1) % ADLER_BASE
+    sum2 = (
+        sum2 + ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) +
+        ADLER_BASE - rem
+    ) % ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def deflate(s, level):
+    """
+        Compresses s into a byte-aligned run of non-final raw deflate blocks.
+    """
+    c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(s) + c.flush(zlib.Z_SYNC_FLUSH)
+
+
+class Segment:
+    """
+        A precompressed static segment.
+    """
+    def __init__(self, data, level):
+        self.length = len(data)
+        self.deflated = deflate(data, level)
+        self.crc = zlib.crc32(data) & 0xffffffff
+        self.adler = zlib.adler32(data) & 0xffffffff
+        self.shift = crc32Shift(len(data))
+
+
+class Splicer:
+    def __init__(self, level=6):
+        self.level = level
+        self.zlibheader = zlib.compress("", level)[:2]
+
+    def segment(self, data):
+        return Segment(data, self.level)
+
+    def splice(self, pieces, encoding="gzip"):
+        """
+            Takes a list of pieces, each either a Segment or a string to be
+            compressed now, and returns a list of byte strings that together
+            make up a gzip or zlib stream of the concatenated pieces.
+            Encoding is "gzip" or "deflate".
+        """
+        if encoding == "gzip":
+            ret = [GZIP_HEADER]
+        elif encoding == "deflate":
+            ret = [self.zlibheader]
+        else:
+            raise ValueError("Unknown encoding: %s"%encoding)
+        crc, adler, length = 0, 1, 0
+        for p in pieces:
+            if isinstance(p, Segment):
+                if not p.length:
+                    continue
+                ret.append(p.deflated)
+                crc = crc32Combine(crc, p.crc, p.shift)
+                adler = adler32Combine(adler, p.adler, p.length)
+                length += p.length
+            elif p:
+                ret.append(deflate(p, self.level))
+                crc = zlib.crc32(p, crc) & 0xffffffff
+                adler = zlib.adler32(p, adler) & 0xffffffff
+                length += len(p)
+        ret.append(FINAL_BLOCK)
+        if encoding == "gzip":
+            ret.append(struct.pack("<II", crc, length & 0xffffffff))
+        else:
+            ret.append(struct.pack(">I", adler))
+        return ret
@@ -11,9 +11,29 @@ import re
 __version__ = '0.1.1'
 
 
+PSEUDOCLASSCOLON_RE = re.compile(r"(^|\})(([^\{\:])+\:)+([^\{]*\{)")
+SPACE_BEFORE_RE = re.compile(r"\s+([!{};:>+\(\)\],])")
+CHARSET_FIRST_RE = re.compile(r"^(.*)(@charset \"[^\"]*\";)")
+CHARSET_DUPES_RE = re.compile(r"^(\s*@charset [^;]+;\s*)+")
+AND_PAREN_RE = re.compile(r"\band\(")
+SPACE_AFTER_RE = re.compile(r"([!{}:;>+\(\[,])\s+")
+SEMICOLONS_BRACE_RE = re.compile(r";+\}")
+EMPTY_RULES_RE = re.compile(r"[^\}\{]+\{\}")
+RGB_RE = re.compile(r"rgb\s*\(\s*([0-9,\s]+)\s*\)")
+ZERO_UNITS_RE = re.compile(r"([\s:])(0)(px|em|%|in|cm|mm|pc|pt|ex)")
+FLOATING_POINTS_RE = re.compile(r"(:|\s)0+\.(\d+)")
+HEX_COLOR_RE = re.compile(r"([^\"'=\s])(\s*)#([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])")
+WHITESPACE_RE = re.compile(r"\s+")
+SEMICOLONS_RE = re.compile(r";;+")
+
+
 def remove_comments(css):
     """Remove all CSS comment blocks."""
     
+    # Kept stretches of the stylesheet are collected and joined once at the
+    # end, rather than reslicing the whole string for every comment.
+    kept = []
+    kept_start = 0
     iemac = False
     preserve = False
     comment_start = css.find("/*")
@@ -25,24 +45,22 @@ def remove_comments(css):
         comment_end = css.find("*/", comment_start + 2)
         if comment_end < 0:
             if not preserve:
-                css = css[:comment_start]
-                break
-        elif comment_end >= (comment_start + 2):
-            if css[comment_end - 1] == "\\":
-                # This is an IE Mac-specific comment; leave this one and the
-                # following one alone.
-                comment_start = comment_end + 2
-                iemac = True
-            elif iemac:
-                comment_start = comment_end + 2
-                iemac = False
-            elif not preserve:
-                css = css[:comment_start] + css[comment_end + 2:]
-            else:
-                comment_start = comment_end + 2
-        comment_start = css.find("/*", comment_start)
-    
-    return css
+                kept.append(css[kept_start:comment_start])
+                kept_start = len(css)
+            break
+        if css[comment_end - 1] == "\\":
+            # This is an IE Mac-specific comment; leave this one and the
+            # following one alone.
+            iemac = True
+        elif iemac:
+            iemac = False
+        elif not preserve:
+            kept.append(css[kept_start:comment_start])
+            kept_start = comment_end + 2
+        comment_start = css.find("/*", comment_end + 2)
+    
+    kept.append(css[kept_start:])
+    return "".join(kept)
 
 
 def remove_unnecessary_whitespace(css):
@@ -57,33 +75,26 @@ def remove_unnecessary_whitespace(css):
         translated back again later.
         """
         
-        regex = re.compile(r"(^|\})(([^\{\:])+\:)+([^\{]*\{)")
-        match = regex.search(css)
-        while match:
-            css = ''.join([
-                css[:match.start()],
-                match.group().replace(":", "___PSEUDOCLASSCOLON___"),
-                css[match.end():]])
-            match = regex.search(css)
-        return css
+        return PSEUDOCLASSCOLON_RE.sub(
+            lambda m: m.group().replace(":", "___PSEUDOCLASSCOLON___"), css)
     
     css = pseudoclasscolon(css)
     # Remove spaces from before things.
-    css = re.sub(r"\s+([!{};:>+\(\)\],])", r"\1", css)
+    css = SPACE_BEFORE_RE.sub(r"\1", css)
     
     # If there is a `@charset`, then only allow one, and move to the beginning.
-    css = re.sub(r"^(.*)(@charset \"[^\"]*\";)", r"\2\1", css)
-    css = re.sub(r"^(\s*@charset [^;]+;\s*)+", r"\1", css)
+    css = CHARSET_FIRST_RE.sub(r"\2\1", css)
+    css = CHARSET_DUPES_RE.sub(r"\1", css)
     
     # Put the space back in for a few cases, such as `@media screen` and
     # `(-webkit-min-device-pixel-ratio:0)`.
-    css = re.sub(r"\band\(", "and (", css)
+    css = AND_PAREN_RE.sub("and (", css)
     
     # Put the colons back.
     css = css.replace('___PSEUDOCLASSCOLON___', ':')
     
     # Remove spaces from after things.
-    css = re.sub(r"([!{}:;>+\(\[,])\s+", r"\1", css)
+    css = SPACE_AFTER_RE.sub(r"\1", css)
     
     return css
 
@@ -91,32 +102,28 @@ def remove_unnecessary_whitespace(css):
 def remove_unnecessary_semicolons(css):
     """Remove unnecessary semicolons."""
     
-    return re.sub(r";+\}", "}", css)
+    return SEMICOLONS_BRACE_RE.sub("}", css)
 
 
 def remove_empty_rules(css):
     """Remove empty rules."""
     
-    return re.sub(r"[^\}\{]+\{\}", "", css)
+    return EMPTY_RULES_RE.sub("", css)
 
 
 def normalize_rgb_colors_to_hex(css):
     """Convert `rgb(51,102,153)` to `#336699`."""
     
-    regex = re.compile(r"rgb\s*\(\s*([0-9,\s]+)\s*\)")
-    match = regex.search(css)
-    while match:
+    def tohex(match):
         colors = match.group(1).split(",")
-        hexcolor = '#%.2x%.2x%.2x' % map(int, colors)
-        css = css.replace(match.group(), hexcolor)
-        match = regex.search(css)
-    return css
+        return '#%.2x%.2x%.2x' % tuple(map(int, colors))
+    return RGB_RE.sub(tohex, css)
 
 
 def condense_zero_units(css):
     """Replace `0(px, em, %, etc)` with `0`."""
     
-    return re.sub(r"([\s:])(0)(px|em|%|in|cm|mm|pc|pt|ex)", r"\1\2", css)
+    return ZERO_UNITS_RE.sub(r"\1\2", css)
 
 
 def condense_multidimensional_zeros(css):
@@ -135,35 +142,31 @@ def condense_multidimensional_zeros(css):
 def condense_floating_points(css):
     """Replace `0.6` with `.6` where possible."""
     
-    return re.sub(r"(:|\s)0+\.(\d+)", r"\1.\2", css)
+    return FLOATING_POINTS_RE.sub(r"\1.\2", css)
 
 
 def condense_hex_colors(css):
     """Shorten colors from #AABBCC to #ABC where possible."""
     
-    regex = re.compile(r"([^\"'=\s])(\s*)#([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])")
-    match = regex.search(css)
-    while match:
+    def condense(match):
         first = match.group(3) + match.group(5) + match.group(7)
         second = match.group(4) + match.group(6) + match.group(8)
         if first.lower() == second.lower():
-            css = css.replace(match.group(), match.group(1) + match.group(2) + '#' + first)
-            match = regex.search(css, match.end() - 3)
-        else:
-            match = regex.search(css, match.end())
-    return css
+            return match.group(1) + match.group(2) + '#' + first
+        return match.group()
+    return HEX_COLOR_RE.sub(condense, css)
 
 
 def condense_whitespace(css):
     """Condense multiple adjacent whitespace characters into one."""
     
-    return re.sub(r"\s+", " ", css)
+    return WHITESPACE_RE.sub(" ", css)
 
 
 def condense_semicolons(css):
     """Condense multiple adjacent semicolon characters into one."""
     
-    return re.sub(r";;+", ";", css)
+    return SEMICOLONS_RE.sub(";", css)
 
 
 def wrap_css_lines(css, line_length):
@@ -0,0 +1,248 @@
+"""
+    Cross-stylesheet optimisation of minified CSS: selectors that can't match
+    anything in an app are dropped, and rules with duplicate selectors or
+    identical bodies are merged, without changing the cascade.
+
+    Pruning is conservative. Type selectors, attribute selectors and
+    selectors using :not() are always kept. A class or ID is considered used
+    if it occurs as a word anywhere in the app's templates or scripts, or
+    starts with a word ending in "-" or "_" (for names built by string
+    concatenation).
+
+    Rules are only merged across rules that don't set any property in the
+    same family (e.g. margin and margin-left, or font and line-height), and
+    never across at-rules or comments. Selector groups containing vendor
+    extensions are never merged, since a browser that doesn't understand
+    one selector in a group drops the whole rule.
+"""
+import re
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_-]+")
+_NAME_RE = re.compile(r"[.#](-?[A-Za-z_][\w-]*)")
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_VENDOR_RE = re.compile(r"::|:-|-moz-|-webkit-|-ms-|-o-")
+
+
+class ParseError(Exception):
+    pass
+
+
+def _scan(s, pos, stops):
+    """
+        Returns the offset of the first character in stops at or after pos,
+        skipping over strings, comments and parenthesised groups.
+    """
+    depth = 0
+    while pos < len(s):
+        c = s[pos]
+        if s.startswith("/*", pos):
+            end = s.find("*/", pos + 2)
+            if end < 0:
+                raise ParseError("Unterminated comment")
+            pos = end + 1
+        elif c in "\"'":
+            end = pos + 1
+            while end < len(s) and s[end] != c:
+                end += 2 if s[end] == "\\" else 1
+            if end >= len(s):
+                raise ParseError("Unterminated string")
+            pos = end
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif depth <= 0 and c in stops:
+            return pos
+        pos += 1
+    return -1
+
+
+def _split(s, sep):
+    ret, pos = [], 0
+    while 1:
+        end = _scan(s, pos, sep)
+        if end < 0:
+            ret.append(s[pos:])
+            return ret
+        ret.append(s[pos:end])
+        pos = end + 1
+
+
+def _uncomment(s):
+    return _COMMENT_RE.sub("", s)
+
+
+def parse(css):
+    """
+        Parses minified CSS into a list of nodes, each either a
+        ("rule", selectors, declarations) tuple with lists of strings, or a
+        ("raw", text) tuple for anything else.
+    """
+    ret = []
+    pos = 0
+    while pos < len(css):
+        if css.startswith("/*", pos):
+            end = css.find("*/", pos + 2)
+            if end < 0:
+                raise ParseError("Unterminated comment")
+            ret.append(("raw", css[pos:end+2]))
+            pos = end + 2
+        elif css[pos] == "@":
+            end = _scan(css, pos, ";{")
+            if end < 0:
+                raise ParseError("Unterminated at-rule")
+            if css[end] == "{":
+                depth = 0
+                while end < len(css):
+                    end = _scan(css, end, "{}")
+                    if end < 0:
+                        raise ParseError("Unterminated block")
+                    depth += 1 if css[end] == "{" else -1
+                    end += 1
+                    if not depth:
+                        break
+            else:
+                end += 1
+            ret.append(("raw", css[pos:end]))
+            pos = end
+        elif css[pos].isspace():
+            pos += 1
+        else:
+            start = _scan(css, pos, "{}")
+            if start < 0 or css[start] != "{":
+                raise ParseError("Expected {")
+            end = _scan(css, start + 1, "{}")
+            if end < 0 or css[end] != "}":
+                raise ParseError("Expected }")
+            selectors = [
+                i.strip() for i in _split(_uncomment(css[pos:start]), ",")
+            ]
+            declarations = [
+                i.strip() for i in _split(_uncomment(css[start+1:end]), ";")
+                if i.strip()
+            ]
+            ret.append(("rule", selectors, declarations))
+            pos = end + 1
+    return ret
+
+
+def serialize(nodes):
+    ret = []
+    for n in nodes:
+        if n[0] == "raw":
+            ret.append(n[1])
+        else:
+            ret.append("%s{%s}"%(",".join(n[1]), ";".join(n[2])))
+    return "".join(ret)
+
+
+def words(sources):
+    """
+        Returns the set of words that can be class or ID names in a list of
+        template and script sources.
+    """
+    ret = set()
+    for s in sources:
+        ret.update(_WORD_RE.findall(s))
+    return ret
+
+
+def used(selector, words, prefixes):
+    """
+        Returns False if selector names a class or ID that occurs nowhere in
+        words, and so can't match anything.
+    """
+    if ":not(" in selector:
+        return True
+    for name in _NAME_RE.findall(re.sub(r"\[[^\]]*\]", "", selector)):
+        if name not in words and not name.startswith(prefixes):
+            return False
+    return True
+
+
+def _family(declaration):
+    p = declaration.split(":", 1)[0].strip().lstrip("*_").lower()
+    if p.startswith("-"):
+        p = p[1:].split("-", 1)[-1]
+    p = p.split("-", 1)[0]
+    if p == "line":
+        return "font"
+    return p
+
+
+def _families(declarations):
+    return set(_family(i) for i in declarations)
+
+
+def _mergeable(selectors):
+    return not any(_VENDOR_RE.search(i) for i in selectors)
+
+
+def _merge(nodes, same, combine):
+    """
+        For every rule, looks for a later rule that same() says it can be
+        folded into, and that no rule in between conflicts with. Matching
+        pairs are replaced by combine(earlier, later) at the later position.
+        Returns the number of rules merged away.
+    """
+    merged = 0
+    i = 0
+    while i < len(nodes):
+        a = nodes[i]
+        if a[0] != "rule" or not _mergeable(a[1]):
+            i += 1
+            continue
+        families = _families(a[2])
+        for j in range(i + 1, len(nodes)):
+            b = nodes[j]
+            if b[0] != "rule":
+                break
+            if _mergeable(b[1]) and same(a, b):
+                nodes[j] = combine(a, b)
+                del nodes[i]
+                merged += 1
+                break
+            if families & _families(b[2]):
+                break
+        if nodes[i] is a:
+            i += 1
+    return merged
+
+
+def optimize(stylesheets, words):
+    """
+        Combines a list of minified stylesheets into one, pruned against a set
+        of used words. Returns a (css, report) tuple, where report is a
+        dictionary with before, after, pruned and merged keys. If the CSS
+        can't be parsed, it's concatenated unchanged.
+    """
+    css = "".join(stylesheets)
+    report = dict(before=len(css), after=len(css), pruned=0, merged=0)
+    try:
+        nodes = parse(css)
+    except ParseError:
+        return css, report
+    prefixes = tuple(i for i in words if i[-1] in "-_")
+    kept = []
+    for n in nodes:
+        if n[0] == "rule":
+            selectors = [i for i in n[1] if used(i, words, prefixes)]
+            report["pruned"] += len(n[1]) - len(selectors)
+            if not selectors:
+                continue
+            n = ("rule", selectors, n[2])
+        kept.append(n)
+    nodes = kept
+    report["merged"] += _merge(
+        nodes,
+        lambda a, b: a[1] == b[1],
+        lambda a, b: ("rule", b[1], a[2] + b[2])
+    )
+    report["merged"] += _merge(
+        nodes,
+        lambda a, b: a[2] == b[2],
+        lambda a, b: ("rule", a[1] + [i for i in b[1] if i not in a[1]], b[2])
+    )
+    css = serialize(nodes)
+    report["after"] = len(css)
+    return css, report
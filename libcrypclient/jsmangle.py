@@ -0,0 +1,348 @@
+"""
+    Scope-aware renaming of function-local Javascript identifiers, meant to
+    be run over the output of jsmin.
+
+    Only variables, parameters and function declarations that belong to a
+    function scope are renamed. Top-level declarations are globals shared
+    with the page templates and the other components, so they're never
+    touched, and neither is any variable visible from a scope that uses eval
+    or with. Named function expressions keep their names. New names are
+    never names that stay unchanged anywhere in the input, so a renamed
+    variable can't capture a reference to anything else.
+
+    Anything the tokenizer can't handle makes mangle return its input
+    unchanged.
+"""
+import re
+
+__version__ = "0.1"
+
+KEYWORDS = frozenset("""
+    break case catch class const continue debugger default delete do else
+    enum export extends false finally for function if implements import in
+    instanceof interface let new null package private protected public
+    return static super switch this throw true try typeof var void while
+    with yield
+""".split())
+# Globals referenced from the page templates.
+RESERVED = frozenset([
+    "Data", "List", "ciphertext", "domain", "name", "new_writekey", "run"
+])
+# After these keywords, a slash starts a regular expression.
+_REGEX_KEYWORDS = frozenset([
+    "return", "typeof", "instanceof", "in", "new", "delete", "void",
+    "throw", "case", "do", "else"
+])
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>[ \t\f\v]+)
+  | (?P<nl>[\r\n]+)
+  | (?P<comment>//[^\r\n]*|/\*.*?\*/)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"\\\r\n]|\\[\s\S])*"|'(?:[^'\\\r\n]|\\[\s\S])*')
+  | (?P<punct>>>>=|===|!==|>>>|<<=|>>=|[<>=!+\-*%&|^]=|&&|\|\||\+\+|--|<<|>>
+        |[{}()\[\];,<>+\-*%&|^!~?:=.])
+""", re.X | re.S)
+_REGEX_RE = re.compile(
+    r"/(?:[^/\\\[\r\n]|\\.|\[(?:[^\]\\\r\n]|\\.)*\])+/[A-Za-z$_]*"
+)
+_DIV_RE = re.compile(r"/=?")
+_BRACKETS = {"(": ")", "[": "]", "{": "}"}
+_NAMECHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ$_"
+
+
+class MangleError(Exception):
+    pass
+
+
+def tokenize(js):
+    """
+        Returns a list of (kind, text) tokens, where kind is one of ws, nl,
+        comment, name, number, string, regex or punct.
+    """
+    ret = []
+    prev = None
+    pos, end = 0, len(js)
+    while pos < end:
+        if js[pos] == "/" and js[pos+1:pos+2] not in ("/", "*"):
+            if prev is None or \
+                    (prev[0] == "punct" and prev[1] not in ")]") or \
+                    (prev[0] == "name" and prev[1] in _REGEX_KEYWORDS):
+                kind, m = "regex", _REGEX_RE.match(js, pos)
+            else:
+                kind, m = "punct", _DIV_RE.match(js, pos)
+        else:
+            m = _TOKEN_RE.match(js, pos)
+            kind = m and m.lastgroup
+        if not m:
+            raise MangleError("Can't tokenize at offset %s"%pos)
+        tok = (kind, m.group())
+        ret.append(tok)
+        if kind not in ("ws", "nl", "comment"):
+            prev = tok
+        pos = m.end()
+    return ret
+
+
+class _Variable:
+    def __init__(self, name, scope, fixed):
+        self.name, self.scope, self.fixed = name, scope, fixed
+        self.newname = name
+        self.serial = len(scope.declared)
+        self.refs = 0
+
+
+class _Scope:
+    def __init__(self, parent):
+        self.parent = parent
+        self.children = []
+        self.declared = {}
+        # Indexes of the identifier tokens occurring directly in this scope.
+        self.refs = []
+        self.unsafe = False
+        self.serial = 0
+        if parent:
+            parent.children.append(self)
+
+    def declare(self, name, fixed=False):
+        if name not in self.declared:
+            self.declared[name] = _Variable(
+                name, self, fixed or not self.parent or name in RESERVED
+            )
+
+    def resolve(self, name):
+        s = self
+        while s:
+            if name in s.declared:
+                return s.declared[name]
+            s = s.parent
+        return None
+
+    def walk(self):
+        yield self
+        for c in self.children:
+            for i in c.walk():
+                yield i
+
+
+class _Analysis:
+    """
+        Builds the scope tree of a token list, and resolves every identifier
+        occurrence to a _Variable, or to None for free names.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        # Indexes of the significant tokens, and whether a newline precedes
+        # each of them.
+        self.sig, self.nlbefore = [], []
+        nl = False
+        for i, (kind, text) in enumerate(tokens):
+            if kind in ("ws", "comment"):
+                continue
+            if kind == "nl":
+                nl = True
+                continue
+            self.sig.append(i)
+            self.nlbefore.append(nl)
+            nl = False
+        self.match = self._match()
+        self.root = _Scope(None)
+        self._parse()
+        self.occurrences = []
+        serial = 0
+        for scope in self.root.walk():
+            scope.serial, serial = serial, serial + 1
+            for i in scope.refs:
+                var = scope.resolve(tokens[i][1])
+                if var:
+                    var.refs += 1
+                self.occurrences.append((i, tokens[i][1], var))
+        self.occurrences.sort()
+
+    def text(self, j):
+        if 0 <= j < len(self.sig):
+            return self.tokens[self.sig[j]][1]
+        return None
+
+    def isName(self, j):
+        if 0 <= j < len(self.sig):
+            kind, text = self.tokens[self.sig[j]]
+            return kind == "name" and text not in KEYWORDS
+        return False
+
+    def _match(self):
+        ret, stack = {}, []
+        for j, i in enumerate(self.sig):
+            kind, text = self.tokens[i]
+            if kind != "punct":
+                continue
+            if text in _BRACKETS:
+                stack.append(j)
+            elif text in ")]}":
+                if not stack or _BRACKETS[self.text(stack[-1])] != text:
+                    raise MangleError("Unbalanced %s"%text)
+                ret[stack.pop()] = j
+        if stack:
+            raise MangleError("Unbalanced %s"%self.text(stack[-1]))
+        return ret
+
+    def _declareVars(self, scope, j):
+        """
+            Declares the names in the var statement whose first name is at
+            j. Stops at anything that might end the statement, so a name can
+            be missed but never made up.
+        """
+        while self.isName(j):
+            scope.declare(self.text(j))
+            j += 1
+            while j < len(self.sig):
+                t = self.text(j)
+                if self.nlbefore[j] or t in (";", ")", "]", "}", "in"):
+                    return
+                if t == ",":
+                    j += 1
+                    break
+                if t in _BRACKETS:
+                    j = self.match[j]
+                j += 1
+
+    def _parse(self):
+        scope = self.root
+        ends = []
+        j = 0
+        while j < len(self.sig):
+            while ends and j == ends[-1]:
+                ends.pop()
+                scope = scope.parent
+            t = self.text(j)
+            if t == "function":
+                statement = self.text(j-1) in (None, ";", "{", "}") or \
+                            self.nlbefore[j]
+                j += 1
+                fname = None
+                if self.isName(j):
+                    fname = self.sig[j]
+                    j += 1
+                if self.text(j) != "(" or self.text(self.match[j]+1) != "{":
+                    raise MangleError("Can't parse function")
+                inner = _Scope(scope)
+                if fname is not None:
+                    if statement:
+                        scope.declare(self.tokens[fname][1])
+                        scope.refs.append(fname)
+                    else:
+                        inner.declare(self.tokens[fname][1], fixed=True)
+                        inner.refs.append(fname)
+                for k in range(j+1, self.match[j]):
+                    if self.isName(k):
+                        inner.declare(self.text(k))
+                        inner.refs.append(self.sig[k])
+                j = self.match[j] + 1
+                ends.append(self.match[j])
+                scope = inner
+            elif t in ("var", "let", "const"):
+                self._declareVars(scope, j+1)
+            elif t == "with":
+                scope.unsafe = True
+            elif self.isName(j):
+                prev, nxt = self.text(j-1), self.text(j+1)
+                if prev == ".":
+                    pass
+                elif nxt == ":" and prev in (None, "{", ",", ";", "}", ")"):
+                    pass
+                elif prev in ("break", "continue") and not self.nlbefore[j]:
+                    pass
+                else:
+                    if t == "eval":
+                        scope.unsafe = True
+                    scope.refs.append(self.sig[j])
+            j += 1
+
+
+def _names(exclude):
+    """
+        Generates short identifiers, shortest first, skipping keywords and
+        anything in exclude.
+    """
+    n = 0
+    while 1:
+        i, s = n, _NAMECHARS[n % len(_NAMECHARS)]
+        i //= len(_NAMECHARS)
+        chars = _NAMECHARS + "0123456789"
+        while i:
+            i -= 1
+            s += chars[i % len(chars)]
+            i //= len(chars)
+        n += 1
+        if s not in KEYWORDS and s not in exclude:
+            yield s
+
+
+def _assign(analysis):
+    root = analysis.root
+    for scope in root.walk():
+        if scope.unsafe:
+            s = scope
+            while s:
+                for v in s.declared.values():
+                    v.fixed = True
+                s = s.parent
+    kept = set(RESERVED)
+    for i, name, var in analysis.occurrences:
+        if var is None or var.fixed:
+            kept.add(name)
+    for scope in root.walk():
+        mangled = [v for v in scope.declared.values() if not v.fixed]
+        if not mangled:
+            continue
+        outside = set()
+        for s in scope.walk():
+            for i in s.refs:
+                v = s.resolve(analysis.tokens[i][1])
+                if v is not None and v.scope is not scope:
+                    inner = v.scope
+                    while inner and inner is not scope:
+                        inner = inner.parent
+                    if inner is None:
+                        outside.add(v.newname)
+        mangled.sort(key=lambda v: (-v.refs, v.serial))
+        names = _names(kept | outside)
+        for v in mangled:
+            v.newname = names.next()
+
+
+def mangle(js):
+    """
+        Returns js with function-local identifiers renamed, or js unchanged if
+        it can't be processed.
+    """
+    try:
+        tokens = tokenize(js)
+        analysis = _Analysis(tokens)
+    except MangleError:
+        return js
+    _assign(analysis)
+    out = [text for kind, text in tokens]
+    for i, name, var in analysis.occurrences:
+        if var is not None:
+            out[i] = var.newname
+    return "".join(out)
+
+
+def bindings(js):
+    """
+        Returns the binding structure of js: a list with an entry for every
+        identifier occurrence in order, either ("free", name) or ("local",
+        scope, variable), where scope and variable are serial numbers. Two
+        programs with the same tokens apart from identifiers, and the same
+        bindings, differ only by a consistent renaming.
+    """
+    analysis = _Analysis(tokenize(js))
+    ret = []
+    for i, name, var in analysis.occurrences:
+        if var is None or not var.scope.parent:
+            ret.append(("free", name))
+        else:
+            ret.append(("local", var.scope.serial, var.serial))
+    return ret
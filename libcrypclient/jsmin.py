@@ -30,13 +30,13 @@
 # SOFTWARE.
 # */
 
+import re
 from StringIO import StringIO
 
+__version__ = '0.2'
+
 def jsmin(js):
-    ins = StringIO(js)
-    outs = StringIO()
-    JavascriptMinify().minify(ins, outs)
-    str = outs.getvalue()
+    str = BufferedMinify().minifyString(js)
     if len(str) > 0 and str[0] == '\n':
         str = str[1:]
     return str
@@ -212,6 +212,167 @@ class JavascriptMinify(object):
         self._jsmin()
         self.instream.close()
 
+
+# Control characters are translated to spaces, and carriage returns to
+# linefeeds, in a single pass over the input. After translation the only
+# characters <= '\n' are '\n' itself and the '\000' EOF sentinel.
+_TRANSLATE = "".join(
+    c if (c >= ' ' or c == '\n') else ('\n' if c == '\r' else ' ')
+    for c in map(chr, range(256))
+)
+_UTRANSLATE = dict(
+    (i, u'\n' if i == 13 else u' ') for i in range(32) if i != 10
+)
+# A run of characters that can be copied straight through.
+_ORDINARY = re.compile(r"[^ \n\"'/\000]*")
+_WHITESPACE = re.compile(r"[ \n]*")
+_SPACES = re.compile(r" *")
+_STRINGBODY = {
+    '"': re.compile(r'[^"\\\n\000]*(?:\\[^\000][^"\\\n\000]*)*'),
+    "'": re.compile(r"[^'\\\n\000]*(?:\\[^\000][^'\\\n\000]*)*"),
+}
+_REGEXBODY = re.compile(r"[^/\\\n\000]*(?:\\[^\000][^/\\\n\000]*)*")
+_REGEXPREFIX = "(,=:[?!&|;{}\n"
+_NEWLINESUFFIX = "}])+-\"'"
+
+class BufferedMinify(object):
+    """
+        A drop-in replacement for JavascriptMinify that produces identical
+        output. Instead of reading a character at a time, the whole input is
+        translated up front and runs of ordinary characters, whitespace,
+        comments, strings and regular expression literals are consumed with
+        regexes and slicing.
+    """
+    def _get(self):
+        c = self.s[self.i]
+        if c != '\000':
+            self.i += 1
+        return c
+
+    def _next(self):
+        """get the next character, excluding comments.
+        """
+        c = self._get()
+        if c == '/' and self.theA != '\\':
+            s, i = self.s, self.i
+            p = s[i]
+            if p == '/':
+                e = s.find('\n', i + 1)
+                if e < 0:
+                    self.i = len(s) - 1
+                    return '\000'
+                self.i = e + 1
+                return '\n'
+            if p == '*':
+                e = s.find('*/', i + 1)
+                if e < 0:
+                    raise UnterminatedComment()
+                self.i = e + 2
+                return ' '
+        return c
+
+    def _nextB(self):
+        """
+            Get the next B, handling a regular expression literal if one
+            starts here.
+        """
+        self.theB = self._next()
+        if self.theB == '/' and self.theA in _REGEXPREFIX:
+            s, i = self.s, self.i
+            e = _REGEXBODY.match(s, i).end()
+            if s[e] != '/':
+                raise UnterminatedRegularExpression()
+            self.out.append(self.theA)
+            self.out.append('/')
+            self.out.append(s[i:e])
+            self.i = e + 1
+            self.theA = '/'
+            self.theB = self._next()
+
+    def _action(self, action):
+        """
+            Same as JavascriptMinify._action, with strings consumed whole.
+        """
+        if action <= 1:
+            self.out.append(self.theA)
+        if action <= 2:
+            self.theA = self.theB
+            if self.theA == "'" or self.theA == '"':
+                s, i = self.s, self.i
+                e = _STRINGBODY[self.theA].match(s, i).end()
+                if s[e] != self.theA:
+                    raise UnterminatedStringLiteral()
+                self.out.append(self.theA)
+                self.out.append(s[i:e])
+                self.i = e + 1
+        self._nextB()
+
+    def _jsmin(self):
+        self.theA = '\n'
+        self._action(3)
+        while self.theA != '\000':
+            a, b = self.theA, self.theB
+            if a == ' ' or a == '\n':
+                if b == ' ' or b == '\n':
+                    # Whitespace collapses to a linefeed if it contains one,
+                    # and to a space otherwise.
+                    s, i = self.s, self.i
+                    e = _WHITESPACE.match(s, i).end()
+                    if a == '\n' or b == '\n' or s.find('\n', i, e) >= 0:
+                        self.theA = '\n'
+                    else:
+                        self.theA = ' '
+                    self.i = e
+                    self._nextB()
+                elif a == '\n' and b in ['{', '[', '(', '+', '-']:
+                    self._action(1)
+                elif isAlphanum(b):
+                    self._action(1)
+                else:
+                    self._action(2)
+            elif b == ' ' or b == '\n':
+                if isAlphanum(a) or (b == '\n' and a in _NEWLINESUFFIX):
+                    self._action(1)
+                elif a in _NEWLINESUFFIX:
+                    # Spaces are deleted, but a linefeed is kept.
+                    self.i = _SPACES.match(self.s, self.i).end()
+                    self._nextB()
+                else:
+                    # Every whitespace character in the run is deleted.
+                    self.i = _WHITESPACE.match(self.s, self.i).end()
+                    self._nextB()
+            elif b not in ('"', "'", '/', '\000'):
+                # Copy a run of ordinary characters straight through.
+                s, i = self.s, self.i
+                e = _ORDINARY.match(s, i).end()
+                self.out.append(a)
+                if e > i:
+                    self.out.append(b)
+                    self.out.append(s[i:e-1])
+                    self.theA = s[e-1]
+                else:
+                    self.theA = b
+                self.i = e
+                self._nextB()
+            else:
+                self._action(1)
+
+    def minifyString(self, js):
+        if isinstance(js, unicode):
+            js = js.translate(_UTRANSLATE)
+        else:
+            js = js.translate(_TRANSLATE)
+        self.s = js + '\000'
+        self.i = 0
+        self.out = []
+        self._jsmin()
+        return "".join(self.out)
+
+    def minify(self, instream, outstream):
+        outstream.write(self.minifyString(instream.read()))
+        instream.close()
+
+
 if __name__ == '__main__':
     import sys
     jsm = JavascriptMinify()
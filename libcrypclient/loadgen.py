@@ -0,0 +1,297 @@
+"""
+    In-process load generation for the render API: Pad.existing, Pad.new,
+    Converter.render and pad.hash are driven from a number of threads or
+    processes sharing one built Pad and Converter, and per-operation latency
+    histograms, throughput and scaling efficiency are reported.
+
+    Thread runs share the interpreter, so they show GIL contention; process
+    runs fork after the applications are built, so workers start with the
+    same compiled templates and no per-process build cost.
+"""
+import time, math, random, threading, multiprocessing, Queue
+import json, base64, binascii
+import pad
+
+OPERATIONS = ["existing", "new", "render", "hash"]
+WRITEKEY = "a" * 40
+
+
+class Histogram:
+    """
+        A latency histogram with logarithmic buckets, RESOLUTION to a decade.
+        Percentiles are the upper bound of the bucket they fall in, so they
+        are accurate to about 6%.
+    """
+    RESOLUTION = 40
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min, self.max = None, 0.0
+
+    def add(self, t):
+        i = int(math.floor(math.log10(max(t, 1e-9)) * self.RESOLUTION))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+        self.total += t
+        self.max = max(self.max, t)
+        if self.min is None or t < self.min:
+            self.min = t
+
+    def merge(self, other):
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+
+    def bound(self, i):
+        return 10 ** (float(i + 1) / self.RESOLUTION)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100.0
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= target:
+                return min(self.bound(i), self.max)
+        return self.max
+
+    def summary(self):
+        """
+            Returns a dictionary with count, mean, min, max, p50, p95 and p99
+            keys, in seconds, and the histogram itself as a list of
+            [upper bound, count] pairs.
+        """
+        return dict(
+            count = self.count,
+            mean = self.total/self.count if self.count else 0.0,
+            min = self.min or 0.0,
+            max = self.max,
+            p50 = self.percentile(50),
+            p95 = self.percentile(95),
+            p99 = self.percentile(99),
+            histogram = [
+                [self.bound(i), self.buckets[i]] for i in sorted(self.buckets)
+            ],
+        )
+
+
+def _blob(ct):
+    return json.dumps(dict(
+        iv = "CVq3J5h3zCZfdVhOYTqAVA",
+        v = 1, iter = 1000, ks = 128, ts = 64,
+        mode = "ccm", adata = "", cipher = "aes",
+        salt = "tv8PEODvC9Q",
+        ct = ct
+    ))
+
+
+# The length of the JSON wrapper around the ciphertext.
+_OVERHEAD = len(_blob(""))
+
+
+def ciphertext(size, r):
+    """
+        Returns an sjcl-style JSON blob with a random ciphertext, using the
+        random.Random instance r. Size is the length of the whole blob, which
+        is what pads check against PAD_SIZE_LIMIT; the blob is up to 3 bytes
+        shorter, since base64 comes in 4-byte units, and never shorter than
+        the JSON wrapper itself. Also used by bench.py.
+    """
+    n = max(0, size - _OVERHEAD) // 4 * 3
+    raw = binascii.unhexlify("%0*x"%(n*2, r.getrandbits(n*8))) if n else ""
+    return _blob(base64.b64encode(raw))
+
+
+def parseSizes(spec):
+    """
+        Parses a ciphertext size distribution, and returns a function that
+        takes a random.Random instance and returns a size. Specs look like
+        one of:
+
+            1024                    a fixed size
+            1024:6,10240:3,102400:1 sizes with relative weights
+            uniform:LOW:HIGH        uniformly distributed
+            lognormal:MEDIAN:SIGMA  log-normally distributed
+
+        Sizes are of the whole ciphertext blob, and are capped at
+        pad.PAD_SIZE_LIMIT, since no pad can be saved with a larger one.
+        Raises ValueError for an invalid spec.
+    """
+    parts = spec.split(":")
+    try:
+        if parts[0] == "uniform" and len(parts) == 3:
+            low, high = int(parts[1]), int(parts[2])
+            if not 0 <= low <= high:
+                raise ValueError
+            f = lambda r: r.randint(low, high)
+        elif parts[0] == "lognormal" and len(parts) == 3:
+            mu, sigma = math.log(float(parts[1])), float(parts[2])
+            f = lambda r: int(r.lognormvariate(mu, sigma))
+        else:
+            choices = parseWeights(spec, int)
+            if any(i < 0 for i, _ in choices):
+                raise ValueError
+            f = lambda r: _choose(choices, r)
+    except ValueError:
+        raise ValueError, "Invalid size distribution: %s"%spec
+    return lambda r: min(f(r), pad.PAD_SIZE_LIMIT)
+
+
+def parseWeights(spec, conv=str):
+    """
+        Parses a comma-separated list of value:weight pairs, where the weight
+        defaults to 1, and returns a list of (value, weight) tuples.
+    """
+    ret = []
+    for i in spec.split(","):
+        value, _, weight = i.partition(":")
+        weight = float(weight) if weight else 1.0
+        if weight < 0:
+            raise ValueError, "Negative weight: %s"%i
+        ret.append((conv(value.strip()), weight))
+    if not ret or not sum(w for _, w in ret):
+        raise ValueError, "No weights: %s"%spec
+    return ret
+
+
+def _choose(choices, r):
+    x = r.random() * sum(w for _, w in choices)
+    for value, weight in choices:
+        x -= weight
+        if x < 0:
+            return value
+    return choices[-1][0]
+
+
+class Workload:
+    """
+        A mix of operations over a fixed pool of ciphertexts, generated up
+        front so that generating them isn't measured.
+    """
+    def __init__(self, app, converter, sizes, mix, samples=64, seed=0):
+        for op, _ in mix:
+            if op not in OPERATIONS:
+                raise ValueError, "Unknown operation: %s"%op
+        self.pad, self.converter, self.mix = app, converter, mix
+        r = random.Random(seed)
+        self.data = [ciphertext(sizes(r), r) for i in range(samples)]
+        self.pages = []
+        if "hash" in dict(mix):
+            self.pages = [app.existing("name", i) for i in self.data]
+
+    def call(self, op, i):
+        if op == "existing":
+            self.pad.existing("name", self.data[i])
+        elif op == "new":
+            self.pad.new("name", WRITEKEY)
+        elif op == "render":
+            self.converter.render("name", self.data[i])
+        else:
+            pad.hash(self.pages[i], True)
+
+    def run(self, duration, seed):
+        """
+            Runs the workload for duration seconds, and returns an
+            (operations, elapsed, histograms) tuple, where histograms maps
+            operation names to Histograms.
+        """
+        r = random.Random(seed)
+        histograms = dict((op, Histogram()) for op, _ in self.mix)
+        n = 0
+        start = now = time.time()
+        end = start + duration
+        while now < end:
+            op = _choose(self.mix, r)
+            i = r.randrange(len(self.data))
+            self.call(op, i)
+            t = time.time()
+            histograms[op].add(t - now)
+            now = t
+            n += 1
+        return n, now - start, histograms
+
+
+def _worker(workload, duration, seed, go, results):
+    go.wait()
+    results.put(workload.run(duration, seed))
+
+
+def run(workload, mode, workers, duration):
+    """
+        Runs workload in workers threads or processes, depending on mode,
+        and returns a result dictionary.
+    """
+    if mode == "thread":
+        go, results = threading.Event(), Queue.Queue()
+        spawn = threading.Thread
+    elif mode == "process":
+        go, results = multiprocessing.Event(), multiprocessing.Queue()
+        spawn = multiprocessing.Process
+    else:
+        raise ValueError, "Unknown concurrency mode: %s"%mode
+    procs = [
+        spawn(target=_worker, args=(workload, duration, i, go, results))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.daemon = True
+        p.start()
+    go.set()
+    outcomes = [results.get() for p in procs]
+    for p in procs:
+        p.join()
+    total = Histogram()
+    histograms = dict((op, Histogram()) for op, _ in workload.mix)
+    for _, _, h in outcomes:
+        for op, i in h.items():
+            histograms[op].merge(i)
+            total.merge(i)
+    return dict(
+        mode = mode,
+        workers = workers,
+        operations = sum(i[0] for i in outcomes),
+        throughput = sum(i[0]/i[1] for i in outcomes if i[1]),
+        latency = total.summary(),
+        ops = dict((op, h.summary()) for op, h in histograms.items()),
+    )
+
+
+def scaling(results):
+    """
+        Adds an efficiency key to each of a list of results: the throughput
+        per worker, relative to the throughput per worker of the run with the
+        fewest workers in the same mode. Perfect scaling is 1.0.
+    """
+    base = {}
+    for r in results:
+        b = base.get(r["mode"])
+        if b is None or r["workers"] < b["workers"]:
+            base[r["mode"]] = r
+    for r in results:
+        b = base[r["mode"]]
+        per = b["throughput"] / b["workers"]
+        r["efficiency"] = r["throughput"] / r["workers"] / per if per else 0.0
+    return results
+
+
+def format(results):
+    """
+        Formats a list of results as a table, with latencies in milliseconds.
+    """
+    ret = ["%-8s %7s %10s %8s %8s %8s %8s %6s"%(
+        "mode", "workers", "ops/s", "p50", "p95", "p99", "max", "eff"
+    )]
+    for r in results:
+        l = r["latency"]
+        ret.append("%-8s %7d %10.1f %8.3f %8.3f %8.3f %8.3f %6.2f"%(
+            r["mode"], r["workers"], r["throughput"],
+            l["p50"]*1000, l["p95"]*1000, l["p99"]*1000, l["max"]*1000,
+            r.get("efficiency", 0)
+        ))
+    return "\n".join(ret)
@@ -0,0 +1,153 @@
+"""
+    A persistent, content-addressed cache for minified components, shared
+    between processes through the filesystem.
+"""
+import os, os.path, hashlib, tempfile
+import jsmin, cssmin, jsmangle
+
+VERSION = "jsmin-%s/cssmin-%s/jsmangle-%s"%(
+    jsmin.__version__, cssmin.__version__, jsmangle.__version__
+)
+DEFAULT_PATH = os.environ.get(
+    "CRYPSR_CACHE",
+    os.path.expanduser(os.path.join("~", ".cache", "crypsr"))
+)
+DEFAULT_MAXSIZE = 16 * 1024 * 1024
+
+
+class MinCache:
+    """
+        Minified output is stored in one file per entry, named by the SHA256
+        of the component kind, the minifier version, the exclusion ranges and
+        the source. Entries are written to a temporary file and renamed into
+        place, so concurrent writers never expose partial entries. When the
+        total size exceeds maxsize, the least recently used entries (by
+        mtime, which is touched on every hit) are evicted.
+
+        Caching is skipped entirely if enabled is False, or if the
+        CRYPSR_NOCACHE environment variable is set.
+
+        The cache directory is only scanned when the running total of bytes
+        written takes the cache over maxsize, and every SCAN_INTERVAL puts to
+        account for other processes writing to it.
+    """
+    SCAN_INTERVAL = 64
+    def __init__(self, path=DEFAULT_PATH, maxsize=DEFAULT_MAXSIZE):
+        self.path, self.maxsize = path, maxsize
+        self.enabled = not os.environ.get("CRYPSR_NOCACHE")
+        self.hits, self.misses, self.evictions, self.saved = 0, 0, 0, 0
+        # Estimated total size of the cache, or None before the first scan.
+        self.size = None
+        self.puts = 0
+
+    def key(self, kind, data, exclusions):
+        h = hashlib.sha256()
+        h.update("%s\0%s\0%r\0"%(kind, VERSION, sorted(exclusions)))
+        h.update(data)
+        return h.hexdigest()
+
+    def get(self, kind, data, exclusions):
+        """
+            Returns the cached minified form of data, or None.
+        """
+        if not self.enabled:
+            return None
+        p = os.path.join(self.path, self.key(kind, data, exclusions))
+        try:
+            f = open(p, "rb")
+            try:
+                ret = f.read()
+            finally:
+                f.close()
+            os.utime(p, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved += len(data)
+        return ret
+
+    def put(self, kind, data, exclusions, minified):
+        """
+            Stores the minified form of data. Failures to write are ignored -
+            the cache is an optimisation only.
+        """
+        if not self.enabled:
+            return
+        p = os.path.join(self.path, self.key(kind, data, exclusions))
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp")
+            try:
+                f = os.fdopen(fd, "wb")
+                try:
+                    f.write(minified)
+                finally:
+                    f.close()
+                os.rename(tmp, p)
+            except:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+        except (IOError, OSError):
+            return
+        self.puts += 1
+        if self.size is not None:
+            self.size += len(minified)
+        if self.size is None or self.size > self.maxsize or \
+                not self.puts % self.SCAN_INTERVAL:
+            self.evict()
+
+    def entries(self):
+        """
+            Returns a list of (mtime, size, path) tuples, oldest first.
+        """
+        ret = []
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return ret
+        for i in names:
+            if i.startswith("."):
+                continue
+            p = os.path.join(self.path, i)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            ret.append((st.st_mtime, st.st_size, p))
+        ret.sort()
+        return ret
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(i[1] for i in entries)
+        for mtime, size, p in entries:
+            if total <= self.maxsize:
+                break
+            try:
+                os.unlink(p)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def clear(self):
+        for mtime, size, p in self.entries():
+            try:
+                os.unlink(p)
+            except OSError:
+                pass
+
+    def stats(self):
+        return dict(
+            hits = self.hits,
+            misses = self.misses,
+            evictions = self.evictions,
+            saved = self.saved,
+        )
+
+
+cache = MinCache()
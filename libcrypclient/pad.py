@@ -1,23 +1,62 @@
-import json, hashlib, re
+import json, hashlib, re, copy, types, multiprocessing
 import cubictemp
-import utils, jsmin, cssmin
+# The minifiers and the minification cache are imported where they're used,
+# so that instances loaded with from_bundle never import them.
+import utils, stats, compress, bundle, zerocopy
 
 HOSTILEMARKER = "// APPHASH_HOSTILE_ZONE"
+ETAG_RE = re.compile(r'(?:W/)?("[^"]*")')
+# Below this many bytes of uncached source, minification is done serially
+# even if a process pool was requested.
+PARALLEL_THRESHOLD = 64 * 1024
+# The largest ciphertext a pad can save. Matches Data.PAD_SIZE_LIMIT in pad.js.
+PAD_SIZE_LIMIT = 1024 * 100
 
 
 def hash(s, hex):
     """
-        Calculates the SHA256 hash of a pad, excluding the hostile zone.
+        Calculates the SHA256 hash of a pad, excluding the hostile zone. The
+        pad can be a string or a Document.
     """
+    if isinstance(s, Document):
+        return s.hash(hex)
+    t = stats.start()
     h = hashlib.sha256()
     hostile = hostileBlock(s, "")
     h.update(hostile)
+    stats.stop(t, "hash", len(s))
     if hex:
         return h.hexdigest()
     else:
         return h.digest()
 
 
+def locateHostile(s):
+    """
+        Returns the (start, end) offsets of the hostile block in s, or None.
+    """
+    hs = s.find(HOSTILEMARKER)
+    he = s.rfind(HOSTILEMARKER)
+    if hs < 0 or he < 0 or he == hs:
+        return None
+    return hs, he + len(HOSTILEMARKER)
+
+
+def notModified(etag, header):
+    """
+        Returns True if the value of an If-None-Match header matches etag, in
+        which case a 304 can be sent instead of the page. As required for
+        If-None-Match, the comparison is weak.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    m = ETAG_RE.match(etag)
+    etag = m.group(1) if m else etag
+    return etag in ETAG_RE.findall(header)
+
+
 def hostileBlock(s, b):
     """
         Replace the hostile block in s with b.
@@ -29,6 +68,66 @@ def hostileBlock(s, b):
     return s[:hs] + b + s[he+len(HOSTILEMARKER):]
 
 
+class Document:
+    """
+        A rendered page, along with the offsets of its slots and hostile zone,
+        recorded at render time. Views into the page are memoryviews, so they
+        can be hashed or written out without rescanning or copying it.
+    """
+    def __init__(self, data, slots, hostile):
+        """
+            slots maps slot names ("name", "writekey", "data") to lists of
+            (start, end) offsets. hostile is the (start, end) offsets of the
+            hostile zone, or None.
+        """
+        self.data, self.slots, self.hostile = data, slots, hostile
+        self._view = memoryview(data)
+
+    def __str__(self):
+        return self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def view(self, start=0, end=None):
+        return self._view[start:end]
+
+    def slot(self, name):
+        """
+            Returns a view of the first occurrence of a slot.
+        """
+        start, end = self.slots[name][0]
+        return self._view[start:end]
+
+    def ciphertext(self):
+        """
+            Returns a view of the quoted ciphertext.
+        """
+        return self.slot("data")
+
+    def outside(self):
+        """
+            Returns a list of views that together make up the page without
+            its hostile zone.
+        """
+        if not self.hostile:
+            return [self._view]
+        hs, he = self.hostile
+        return [self._view[:hs], self._view[he:]]
+
+    def hash(self, hex):
+        """
+            Equivalent to pad.hash(str(self), hex).
+        """
+        h = hashlib.sha256()
+        for i in self.outside():
+            h.update(i)
+        if hex:
+            return h.hexdigest()
+        else:
+            return h.digest()
+
+
 def snip(data, exclusions):
     """
         Exclusions must be non-overlapping. 
@@ -39,34 +138,623 @@ def snip(data, exclusions):
     return "\n".join(lines)
 
 
+def minify(spec, local=None):
+    """
+        Minifies a (kind, data, exclusions) component specification, where
+        kind is "js", "js-mangled" or "css". Exclusions are snipped from
+        Javascript components before minification. Snipping and each
+        minifier are recorded as separate stages, against local if it's given.
+    """
+    import jsmin, cssmin, jsmangle
+    kind, data, exclusions = spec
+    if kind == "css":
+        t = stats.start()
+        ret = cssmin.cssmin(data)
+        stats.stop(t, "cssmin", len(data), local)
+        return ret
+    t = stats.start()
+    data = snip(data, exclusions)
+    stats.stop(t, "snip", len(data), local)
+    t = stats.start()
+    ret = jsmin.jsmin(data)
+    stats.stop(t, "jsmin", len(data), local)
+    if kind == "js-mangled":
+        t = stats.start()
+        ret = jsmangle.mangle(ret)
+        stats.stop(t, "mangle", len(ret), local)
+    return ret
+
+
 class _App:
+    # A stats.Stats instance, set by subclasses that record their own stats.
+    stats = None
+    precompressed = None
+    domain = ""
+    mangle = False
+    cssopt = False
+    # If set, the ciphertext is embedded in an inert data block rather than a
+    # Javascript string literal, and EMBEDLIBS are added to the page to read
+    # it back.
+    embed = False
+    EMBEDLIBS = [("embed", [])]
+    # A zerocopy.Static for the static segments, set by writeStatic, and the
+    # directory they were written to.
+    static = None
+    staticdir = None
+    # The cssopt.optimize report from the last build, if cssopt is set.
+    cssreport = None
+    # Map the paths of components read so far to their contents and SHA256
+    # digests.
+    sources = None
+    digests = None
+    # Maps component paths to ((kind, data, exclusions), minified) tuples.
+    built = None
     CIPHERMARKER = "%%CIPHERMARKER%%"
-    def getComponents(self, jsc, cssc, minimized):
+    NAMEMARKER = "%%NAMEMARKER%%"
+    WRITEKEYMARKER = "%%WRITEKEYMARKER%%"
+    DOMAINMARKER = "%%DOMAINMARKER%%"
+    def minifyAll(self, specs, processes=None):
+        """
+            Minifies a list of (kind, data, exclusions) specifications, going
+            through the minification cache, and returns the results in order.
+
+            If processes is set, cache misses are minified in a pool of that
+            many processes, unless there are fewer than PARALLEL_THRESHOLD
+            bytes of them.
+        """
+        import mincache
+        t = stats.start()
+        ret = [mincache.cache.get(*i) for i in specs]
+        stats.stop(t, "cache", sum(len(i[1]) for i in specs), self.stats)
+        missing = [i for i, v in enumerate(ret) if v is None]
+        todo = [specs[i] for i in missing]
+        size = sum(len(i[1]) for i in todo)
+        if processes and len(todo) > 1 and size >= PARALLEL_THRESHOLD:
+            t = stats.start()
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(minify, todo)
+            finally:
+                pool.close()
+                pool.join()
+            stats.stop(t, "pool", size, self.stats)
+        else:
+            results = [minify(i, self.stats) for i in todo]
+        for i, r in zip(missing, results):
+            mincache.cache.put(*(specs[i] + (r,)))
+            ret[i] = r
+        return ret
+
+    def getJSLibs(self):
+        """
+            Returns the Javascript components this application is built from.
+        """
+        if self.embed:
+            return self.JSLIBS + self.EMBEDLIBS
+        return self.JSLIBS
+
+    def _read(self, path):
+        t = stats.start()
+        d = utils.data.read(path)
+        stats.stop(t, "read", len(d), self.stats)
+        if self.sources is None:
+            self.sources, self.digests = {}, {}
+        if self.sources.get(path) is not d:
+            self.sources[path] = d
+            self.digests[path] = hashlib.sha256(d).hexdigest()
+        return d
+
+    def getComponents(self, jsc, cssc, minimized, processes=None,
+                      mangle=False, templates=None):
         """
             Takes lists of Javascript and CSS resource specifications, and
-            returns lists of corresponding data.
+            returns lists of corresponding data. If mangle is set, local
+            identifiers in minified Javascript are shortened with jsmangle.
+
+            If templates is a list of the application's template sources, the
+            stylesheets are combined into one with cssopt, dropping selectors
+            used by nothing in the templates or the Javascript. The byte
+            saving is recorded in self.cssreport.
+
+            Minified components are remembered, so calling this again only
+            minifies the components that changed in the meantime.
         """
-        jslibs = []
+        paths, specs = [], []
+        kind = "js-mangled" if mangle else "js"
         for i, exclusions in jsc:
-            d = utils.data.read("components/%s.js"%i)
-            d = snip(d, exclusions)
-            jslibs.append(jsmin.jsmin(d) if minimized else d)
-        css = []
+            paths.append("components/%s.js"%i)
+            specs.append((kind, self._read(paths[-1]), exclusions))
+        njs = len(specs)
         for i in cssc:
-            d = utils.data.read("components/%s.css"%i)
-            css.append(cssmin.cssmin(d) if minimized else d)
+            paths.append("components/%s.css"%i)
+            specs.append(("css", self._read(paths[-1]), []))
+        if not minimized:
+            jslibs = [snip(d, e) for _, d, e in specs[:njs]]
+            css = [d for _, d, _ in specs[njs:]]
+        else:
+            ret = self._built(paths, specs, processes)
+            jslibs, css = ret[:njs], ret[njs:]
+        if templates is not None:
+            import cssopt
+            t = stats.start()
+            words = cssopt.words(templates + [d for _, d, _ in specs[:njs]])
+            css, self.cssreport = cssopt.optimize(css, words)
+            css = [css]
+            stats.stop(t, "cssopt", self.cssreport["before"], self.stats)
         return jslibs, css
 
+    def _built(self, paths, specs, processes):
+        """
+            Returns the minified data for a list of component paths and
+            specifications, minifying only those that changed since the last
+            call.
+        """
+        if self.built is None:
+            self.built = {}
+        ret = []
+        for path, spec in zip(paths, specs):
+            prev = self.built.get(path)
+            ret.append(prev[1] if prev and prev[0] == spec else None)
+        missing = [i for i, v in enumerate(ret) if v is None]
+        if missing:
+            results = self.minifyAll([specs[i] for i in missing], processes)
+            for i, r in zip(missing, results):
+                self.built[paths[i]] = (specs[i], r)
+                ret[i] = r
+        return ret
+
     def bootstrap(self, template, jslibs, css, **kwargs):
         """
             Bootstraps an application template. Returns a cubictemp Template
-            instance.
+            instance. The template, components and other string arguments
+            are UTF-8 bytes as read by utils.Data, or unicode.
         """
-        kwargs["css"] = css
-        kwargs["jslibs"] = jslibs
-        bootstrap = cubictemp.Template(template)
+        t = stats.start()
+        for k, v in kwargs.items():
+            kwargs[k] = utils.decode(v)
+        kwargs["css"] = [utils.decode(i) for i in css]
+        kwargs["jslibs"] = [utils.decode(i) for i in jslibs]
+        bootstrap = cubictemp.Template(utils.decode(template))
         bootstrap = unicode(bootstrap(**kwargs))
-        return cubictemp.Template(unicode(bootstrap))
+        ret = cubictemp.Template(bootstrap)
+        stats.stop(t, "bootstrap", len(bootstrap), self.stats)
+        return ret
+
+    def refresh(self, processes=None):
+        """
+            Rebuilds the application in place if any of the files it was
+            built from changed on disk, minifying only the changed components.
+            Returns True if it was rebuilt.
+        """
+        if not self.sources:
+            return False
+        for path, d in self.sources.items():
+            if utils.data.read(path) is not d:
+                break
+        else:
+            return False
+        self.build(processes)
+        if self.staticdir:
+            self.writeStatic(self.staticdir)
+        return True
+
+    def compile(self, template):
+        """
+            Renders a bootstrapped template once, with markers standing in for
+            the dynamic values, and splits the result into a list of static
+            segments interleaved with slots. Returns a (segments, slots) tuple,
+            where slots is a list of (index, slotname) tuples.
+
+            This is where the page is encoded to UTF-8, once. Everything from
+            here on works on bytes.
+        """
+        markers = {
+            self.NAMEMARKER: "name",
+            self.WRITEKEYMARKER: "writekey",
+            self.CIPHERMARKER: "data",
+            self.DOMAINMARKER: "domain",
+        }
+        start = stats.start()
+        t = unicode(template(
+                name=self.NAMEMARKER,
+                writekey=self.WRITEKEYMARKER,
+            )).encode("utf-8")
+        stats.stop(start, "template", len(t), self.stats)
+        expr = "|".join(re.escape(i) for i in markers)
+        segments = re.split("(%s)"%expr, t)
+        slots = [(i, markers[segments[i]]) for i in range(1, len(segments), 2)]
+        return segments, slots
+
+    def prepare(self):
+        """
+            Compiles self.template, and precomputes the hostile zone location,
+            hash state and ETag fingerprint. None of this depends on the
+            domain, so it's shared by all instances made with withDomain.
+        """
+        self.segments, self.slots = self.compile(self.template)
+        self.link()
+
+    def link(self, fingerprint=None):
+        """
+            Precomputes everything derived from the compiled segments and
+            slots.
+        """
+        self.fingerprint = fingerprint or self.compileFingerprint()
+        self.zone = self.locateZone()
+        self.hashstate, self.hashpieces, self.hashchecks = self.compileHash()
+        # Filled in lazily by _precompressed, and shared between domains.
+        self.precompressed = {}
+        # The static segment file no longer matches the segments. It may
+        # still be in use by instances made with withDomain, so it's left to
+        # close when the last of them drops it.
+        self.static = None
+
+    def writeBundle(self, path):
+        """
+            Writes the compiled template to a bundle that from_bundle can
+            load.
+        """
+        meta = dict(
+            app = self.__class__.__name__,
+            domain = self.domain,
+            minimized = getattr(self, "minimized", None),
+            dev = getattr(self, "dev", None),
+            mangle = self.mangle,
+            cssopt = self.cssopt,
+            embed = self.embed,
+            slots = self.slots,
+            fingerprint = self.fingerprint.encode("hex"),
+            components = self.digests or {},
+        )
+        bundle.write(path, meta, self.segments)
+
+    def writeStatic(self, directory):
+        """
+            Writes the static segments to a file in directory, named after the
+            template fingerprint, so that the write_* methods can send them
+            with sendfile. If the file already exists, it's reused. Returns
+            its path.
+
+            Instances made with withDomain share the Static, which may be in
+            use on other threads, so one replaced here or on a rebuild isn't
+            closed. Its file is closed when the last reference goes.
+        """
+        name = "%s-%s.static"%(
+            self.__class__.__name__.lower(), self.fingerprint.encode("hex")[:16]
+        )
+        self.static = zerocopy.write(directory, name, self.segments)
+        self.staticdir = directory
+        return self.static.path
+
+    @classmethod
+    def from_bundle(klass, path, domain=None):
+        """
+            Returns an instance loaded from a bundle written by writeBundle,
+            without minifying, bootstrapping or reading any components. The
+            domain defaults to the one the bundle was built with.
+
+            Instances loaded this way have no template attribute.
+        """
+        t = stats.start()
+        meta, segments = bundle.load(path)
+        if meta["app"] != klass.__name__:
+            raise ValueError, "Bundle is for %s, not %s."%(
+                meta["app"], klass.__name__
+            )
+        self = types.InstanceType(klass)
+        self.stats = stats.Stats()
+        self.domain = meta["domain"] if domain is None else domain
+        self.minimized, self.dev = meta["minimized"], meta["dev"]
+        self.mangle = meta.get("mangle", False)
+        self.cssopt = meta.get("cssopt", False)
+        self.embed = meta.get("embed", False)
+        self.digests = meta["components"]
+        self.template = None
+        self.segments = segments
+        self.slots = [(i, str(slot)) for i, slot in meta["slots"]]
+        self.link(meta["fingerprint"].decode("hex"))
+        stats.stop(t, "bundle", sum(meta["segments"]), self.stats)
+        return self
+
+    def withDomain(self, domain):
+        """
+            Returns an instance for another domain that shares this one's
+            compiled template. Nothing is rebuilt; the new instance only holds
+            references to the shared state.
+
+            The record of the components it was built from is copied, so each
+            instance notices changes on its own refresh.
+        """
+        ret = copy.copy(self)
+        ret.domain = domain
+        for i in ("sources", "digests", "built"):
+            d = getattr(self, i, None)
+            if d is not None:
+                setattr(ret, i, dict(d))
+        return ret
+
+    def compileFingerprint(self):
+        """
+            Returns a digest of the compiled template, covering everything in
+            the page apart from the slot values.
+        """
+        h = hashlib.sha256()
+        for i in self.segments:
+            h.update("%d:"%len(i))
+            h.update(i)
+        return h.digest()
+
+    def locateZone(self):
+        """
+            Finds the hostile zone using the markers in the static segments.
+            Returns a ((segment, offset), (segment, offset)) tuple giving the
+            positions of the first and last markers, or None.
+        """
+        segments = self.segments
+        zs = ze = None
+        for i in range(0, len(segments), 2):
+            p = segments[i].find(HOSTILEMARKER)
+            if p >= 0:
+                zs = (i, p)
+                break
+        for i in range(len(segments) - 1, -1, -2):
+            p = segments[i].rfind(HOSTILEMARKER)
+            if p >= 0:
+                ze = (i, p)
+                break
+        if zs == ze:
+            return None
+        return zs, ze
+
+    def compileHash(self):
+        """
+            Precomputes what pad.hash needs from the compiled template.
+            Everything outside the hostile zone is laid out as a list of
+            static strings and slot names. The SHA256 state up to the first slot outside the
+            zone is saved, so hashing a page only has to feed in what follows.
+
+            Returns a (state, pieces, checks) tuple. Checks is a list of
+            (slotname, context) tuples for the slots outside the zone, where
+            context is the (before, after) static text used to make sure a
+            slot value can't introduce a marker of its own, or None if the
+            neighbouring segments are too short to tell.
+        """
+        segments, L = self.segments, len(HOSTILEMARKER)
+        zs, ze = self.zone or (None, None)
+        pieces, checks = [], []
+        for i, seg in enumerate(segments):
+            if zs and zs[0] < i < ze[0]:
+                continue
+            if i % 2:
+                pieces.append(i)
+                before, after = segments[i-1], segments[i+1]
+                if len(before) < L or len(after) < L:
+                    checks.append((i, None))
+                else:
+                    checks.append((i, (before[-(L-1):], after[:L-1])))
+                continue
+            if zs and i == zs[0]:
+                pieces.append(seg[:zs[1]])
+            if zs and i == ze[0]:
+                pieces.append(seg[ze[1]+L:])
+            if not zs or i not in (zs[0], ze[0]):
+                pieces.append(seg)
+        state = hashlib.sha256()
+        while pieces and not isinstance(pieces[0], int):
+            state.update(pieces.pop(0))
+        slotnames = dict(self.slots)
+        pieces = [slotnames[i] if isinstance(i, int) else i for i in pieces]
+        checks = [(slotnames[i], context) for i, context in checks]
+        return state, pieces, checks
+
+    def _hash(self, name, writekey, data, hex):
+        """
+            Calculates pad.hash of the rendered page without rendering it,
+            where data is a callable returning the quoted ciphertext. If no
+            slot lies outside the hostile zone, nothing per-request is hashed
+            at all.
+        """
+        t = stats.start()
+        h = self.hashstate.copy()
+        size = 0
+        if self.hashpieces:
+            values = self._values(name, writekey, data())
+            if not self._zoneFixed(values):
+                return hash(self._render(name, writekey, data()), hex)
+            for i in self.hashpieces:
+                v = values.get(i, i)
+                h.update(v)
+                size += len(v)
+        stats.stop(t, "hash", size, self.stats)
+        if hex:
+            return h.hexdigest()
+        else:
+            return h.digest()
+
+    def _etag(self, name, writekey, data, encoding):
+        """
+            Returns a strong ETag for the page with the given inputs, without
+            rendering it.
+        """
+        t = stats.start()
+        data = utils.utf8(data)
+        parts = [
+            utils.utf8(self.domain),
+            utils.utf8(name),
+            utils.utf8(writekey),
+            data,
+            encoding or "",
+        ]
+        h = hashlib.sha256(self.fingerprint)
+        for i in parts:
+            h.update("%d:"%len(i))
+            h.update(i)
+        stats.stop(t, "etag", len(data), self.stats)
+        return '"%s"'%h.hexdigest()
+
+    def _zoneFixed(self, values):
+        """
+            Returns True if the slot values can't move the hostile zone away
+            from the markers in the static segments.
+        """
+        for slot, context in self.hashchecks:
+            if context is None or \
+                    HOSTILEMARKER in context[0] + values[slot] + context[1]:
+                return False
+        return True
+
+    def _document(self, name, writekey, data):
+        """
+            Renders the compiled template into a Document, recording slot
+            offsets as it goes.
+        """
+        values = self._values(name, writekey, data)
+        parts = self.segments[:]
+        starts, offsets = [], {}
+        pos = 0
+        for i, slot in self.slots:
+            parts[i] = values[slot]
+        for i, p in enumerate(parts):
+            starts.append(pos)
+            if i % 2:
+                slot = self.slots[i//2][1]
+                offsets.setdefault(slot, []).append((pos, pos + len(p)))
+            pos += len(p)
+        page = "".join(parts)
+        if self.zone and self._zoneFixed(values):
+            zs, ze = self.zone
+            hostile = (
+                starts[zs[0]] + zs[1],
+                starts[ze[0]] + ze[1] + len(HOSTILEMARKER)
+            )
+        else:
+            hostile = locateHostile(page)
+        return Document(page, offsets, hostile)
+
+    def _quote(self, data):
+        """
+            Encodes data to UTF-8, and quotes it for the data slot.
+        """
+        t = stats.start()
+        data = utils.utf8(data)
+        if self.embed:
+            ret = utils.dataquote(data)
+            stats.stop(t, "dataquote", len(data), self.stats)
+        else:
+            ret = utils.jsquote(data)
+            stats.stop(t, "jsquote", len(data), self.stats)
+        return ret
+
+    def _values(self, name, writekey, data):
+        """
+            Returns the slot values as UTF-8 bytes. The domain, name and
+            writekey are HTML-escaped, data is inserted verbatim.
+        """
+        return dict(
+            domain = cubictemp.escape(utils.utf8(self.domain)),
+            name = cubictemp.escape(utils.utf8(name)),
+            writekey = cubictemp.escape(utils.utf8(writekey)),
+            data = utils.utf8(data)
+        )
+
+    def _render(self, name, writekey, data):
+        """
+            Fills the slots of the compiled template.
+        """
+        t = stats.start()
+        values = self._values(name, writekey, data)
+        parts = self.segments[:]
+        for i, slot in self.slots:
+            parts[i] = values[slot]
+        ret = "".join(parts)
+        stats.stop(t, "render", len(ret), self.stats)
+        return ret
+
+    def _precompressed(self):
+        """
+            Returns a (splicer, segments) tuple, where segments are the static
+            segments of the compiled template, compressed once on first use.
+        """
+        if not self.precompressed:
+            t = stats.start()
+            splicer = compress.Splicer()
+            segments = [splicer.segment(i) for i in self.segments[::2]]
+            self.precompressed.update(splicer=splicer, segments=segments)
+            stats.stop(
+                t, "precompress", sum(len(i) for i in self.segments[::2]),
+                self.stats
+            )
+        return self.precompressed["splicer"], self.precompressed["segments"]
+
+    def _compress(self, name, writekey, data, encoding):
+        """
+            Returns the rendered page as a gzip or zlib stream, compressing
+            only the slot values per request.
+        """
+        splicer, segments = self._precompressed()
+        t = stats.start()
+        values = self._values(name, writekey, data)
+        pieces = [segments[0]]
+        for i, slot in self.slots:
+            pieces.append(values[slot])
+            pieces.append(segments[i//2 + 1])
+        ret = "".join(splicer.splice(pieces, encoding))
+        stats.stop(t, "compress", len(ret), self.stats)
+        return ret
+
+    def _write(self, out, name, writekey, data):
+        """
+            Writes the page to out, which is a file descriptor or an object
+            with a fileno method, like a file or a socket. If writeStatic was
+            called, static segments are sent with sendfile and only the slot
+            values are written from memory. Otherwise, or if out doesn't
+            support sendfile, everything is written from memory. Returns the
+            number of bytes written.
+        """
+        t = stats.start()
+        static = self.static if zerocopy.sendfile else None
+        fd = None
+        if isinstance(out, (int, long)):
+            fd = out
+        elif static is not None or not hasattr(out, "writelines"):
+            fd = zerocopy.fileno(out)
+        if fd is None:
+            chunks = list(self._iter(name, writekey, data))
+            out.writelines(chunks)
+            size = sum(len(i) for i in chunks)
+            stats.stop(t, "write", size, self.stats)
+            return size
+        values = self._values(name, writekey, data)
+        slotnames = dict(self.slots)
+        size = 0
+        for i, seg in enumerate(self.segments):
+            if i % 2:
+                seg = values[slotnames[i]]
+            elif static is not None and seg:
+                if static.send(fd, i):
+                    size += len(seg)
+                    continue
+                static = None
+            zerocopy.writeall(fd, seg)
+            size += len(seg)
+        stats.stop(t, "write", size, self.stats)
+        return size
+
+    def _iter(self, name, writekey, data):
+        """
+            Yields the static segments and the slot values in order, without
+            joining them. The static segments are shared, not copied. Empty
+            chunks are skipped.
+        """
+        values = self._values(name, writekey, data)
+        segments = self.segments
+        if segments[0]:
+            yield segments[0]
+        for i, slot in self.slots:
+            if values[slot]:
+                yield values[slot]
+            if segments[i+1]:
+                yield segments[i+1]
 
 
 class Pad(_App):
@@ -90,43 +778,133 @@ class Pad(_App):
         ("pad", [])
     ]
     CSS = ["contrib/resetfontsbase", "pad", "list"]
-    def __init__(self, domain, minimized, dev):
+    def __init__(self, domain, minimized, dev, processes=None, mangle=False,
+                 cssopt=False, embed=False):
+        """
+            If processes is set, minification is spread over a pool of that
+            many processes. If mangle is set, local identifiers in the
+            minified Javascript are shortened. If cssopt is set, the
+            stylesheets are combined, pruned and merged into one. If embed is
+            set, the ciphertext goes into a data block instead of a string
+            literal, which skips Javascript quoting.
+        """
         self.domain = domain
-        self.minimized, self.dev = minimized, dev
-        jslibs, css = self.getComponents(self.JSLIBS, self.CSS, minimized)
+        self.minimized, self.dev, self.mangle = minimized, dev, mangle
+        self.cssopt, self.embed = cssopt, embed
+        self.stats = stats.Stats()
+        self.build(processes)
+
+    def build(self, processes=None):
+        """
+            Builds the application from its components.
+        """
+        template = self._read("components/pad.html")
+        listinclusion = self._read("components/list.html")
+        jslibs, css = self.getComponents(
+            self.getJSLibs(), self.CSS, self.minimized, processes, self.mangle,
+            [template, listinclusion] if self.cssopt else None
+        )
         self.template = self.bootstrap(
-            utils.data.read("components/pad.html"),
+            template,
             jslibs,
             css,
-            domain = self.domain,
+            domain = self.DOMAINMARKER,
             name = "@!name!@",
             data = self.CIPHERMARKER,
             writekey = "@!writekey!@",
-            dev = dev,
-            listinclusion = utils.data.read("components/list.html"),
+            dev = self.dev,
+            embed = self.embed,
+            listinclusion = listinclusion,
         )
-        
+        self.prepare()
+
     def existing(self, name, data):
         """
             Render an existing pad, with the specified name and data blob.
         """
-        t = self.template(
-                name=name,
-                writekey="",
-            )
-        t = str(t).replace(self.CIPHERMARKER, utils.jsquote(data))
-        return t
+        return self._render(name, "", self._quote(data))
 
     def new(self, name, writekey):
         """
             Render a new pad, with the specified name and write key.
         """
-        t = self.template(
-                name=name,
-                writekey=writekey,
-            )
-        t = str(t).replace(self.CIPHERMARKER, "")
-        return unicode(t)
+        return self._render(name, writekey, "")
+
+    def hash_existing(self, name, data, hex=True):
+        """
+            Returns pad.hash(self.existing(name, data), hex), computed from
+            precomputed hash state.
+        """
+        return self._hash(name, "", lambda: self._quote(data), hex)
+
+    def hash_new(self, name, writekey, hex=True):
+        """
+            Returns pad.hash(self.new(name, writekey), hex), computed from
+            precomputed hash state.
+        """
+        return self._hash(name, writekey, lambda: "", hex)
+
+    def document_existing(self, name, data):
+        """
+            Like existing, but returns a Document.
+        """
+        return self._document(name, "", self._quote(data))
+
+    def document_new(self, name, writekey):
+        """
+            Like new, but returns a Document.
+        """
+        return self._document(name, writekey, "")
+
+    def etag(self, name, data, encoding=None):
+        """
+            Returns a strong ETag for existing(name, data), computed without
+            rendering. If the page is sent with a Content-Encoding, pass it as
+            encoding, so each representation gets its own tag.
+        """
+        return self._etag(name, "", data, encoding)
+
+    def iter_existing(self, name, data):
+        """
+            Like existing, but yields the page as a sequence of byte strings,
+            suitable for returning directly from a WSGI application.
+        """
+        return self._iter(name, "", self._quote(data))
+
+    def iter_new(self, name, writekey):
+        """
+            Like new, but yields the page as a sequence of byte strings.
+        """
+        return self._iter(name, writekey, "")
+
+    def write_existing(self, out, name, data):
+        """
+            Writes an existing pad to out, a file descriptor, file or socket,
+            sending the static segments with sendfile if writeStatic was
+            called. Returns the number of bytes written.
+        """
+        return self._write(out, name, "", self._quote(data))
+
+    def write_new(self, out, name, writekey):
+        """
+            Like write_existing, for a new pad.
+        """
+        return self._write(out, name, writekey, "")
+
+    def compress_existing(self, name, data, encoding="gzip"):
+        """
+            Like existing, but returns the page compressed with the given
+            Content-Encoding, "gzip" or "deflate". Only the slot values are
+            compressed per request; the static segments are compressed once.
+        """
+        return self._compress(name, "", self._quote(data), encoding)
+
+    def compress_new(self, name, writekey, encoding="gzip"):
+        """
+            Like new, but returns the page compressed with the given
+            Content-Encoding, "gzip" or "deflate".
+        """
+        return self._compress(name, writekey, "", encoding)
 
 
 class Converter(_App):
@@ -138,28 +916,88 @@ class Converter(_App):
         ("converter", [])
     ]
     CSS = ["contrib/resetfontsbase", "converter"]
-    def __init__(self, domain, minimized, dev):
+    def __init__(self, domain, minimized, dev, processes=None, mangle=False,
+                 cssopt=False, embed=False):
+        """
+            If processes is set, minification is spread over a pool of that
+            many processes. If mangle is set, local identifiers in the
+            minified Javascript are shortened. If cssopt is set, the
+            stylesheets are combined, pruned and merged into one. If embed is
+            set, the ciphertext goes into a data block instead of a string
+            literal, which skips Javascript quoting.
+        """
         self.domain = domain
-        self.minimized, self.dev = minimized, dev
-        jslibs, css = self.getComponents(self.JSLIBS, self.CSS, minimized)
+        self.minimized, self.dev, self.mangle = minimized, dev, mangle
+        self.cssopt, self.embed = cssopt, embed
+        self.stats = stats.Stats()
+        self.build(processes)
+
+    def build(self, processes=None):
+        """
+            Builds the application from its components.
+        """
+        template = self._read("components/converter.html")
+        jslibs, css = self.getComponents(
+            self.getJSLibs(), self.CSS, self.minimized, processes, self.mangle,
+            [template] if self.cssopt else None
+        )
         self.template = self.bootstrap(
-            utils.data.read("components/converter.html"),
+            template,
             jslibs,
             css,
-            domain = self.domain,
+            domain = self.DOMAINMARKER,
             name = "@!name!@",
             data = self.CIPHERMARKER,
             writekey = "@!writekey!@",
-            dev = dev,
+            dev = self.dev,
+            embed = self.embed,
         )
-        
+        self.prepare()
+
     def render(self, name, data):
         """
             Render an existing pad, with the specified name and data blob.
         """
-        t = self.template(
-                name=name,
-                writekey="",
-            )
-        t = str(t).replace(self.CIPHERMARKER, utils.jsquote(data))
-        return t
+        return self._render(name, "", self._quote(data))
+
+    def hash_render(self, name, data, hex=True):
+        """
+            Returns pad.hash(self.render(name, data), hex), computed from
+            precomputed hash state.
+        """
+        return self._hash(name, "", lambda: self._quote(data), hex)
+
+    def document_render(self, name, data):
+        """
+            Like render, but returns a Document.
+        """
+        return self._document(name, "", self._quote(data))
+
+    def etag(self, name, data, encoding=None):
+        """
+            Returns a strong ETag for render(name, data), computed without
+            rendering. If the page is sent with a Content-Encoding, pass it as
+            encoding, so each representation gets its own tag.
+        """
+        return self._etag(name, "", data, encoding)
+
+    def iter_render(self, name, data):
+        """
+            Like render, but yields the page as a sequence of byte strings.
+        """
+        return self._iter(name, "", self._quote(data))
+
+    def write_render(self, out, name, data):
+        """
+            Writes a converter page to out, a file descriptor, file or socket,
+            sending the static segments with sendfile if writeStatic was
+            called. Returns the number of bytes written.
+        """
+        return self._write(out, name, "", self._quote(data))
+
+    def compress_render(self, name, data, encoding="gzip"):
+        """
+            Like render, but returns the page compressed with the given
+            Content-Encoding, "gzip" or "deflate".
+        """
+        return self._compress(name, "", self._quote(data), encoding)
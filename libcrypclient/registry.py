@@ -0,0 +1,155 @@
+"""
+    A thread-safe registry of constructed Pad and Converter instances, keyed
+    on (class, domain, minimized, dev).
+
+    Construction is expensive, but instances for different domains share
+    their compiled state (see _App.withDomain), so the registry builds one
+    instance per (class, minimized, dev) and derives the others from it.
+    Concurrent first use of a key builds it once: other threads wait for the
+    result instead of building it themselves.
+"""
+import sys, threading, collections
+
+DEFAULT_MAXSIZE = 64 * 1024 * 1024
+
+
+def footprint(app):
+    """
+        Estimates the memory held by the compiled state of app, in bytes.
+        Only the large strings are counted, so this is a lower bound.
+    """
+    n = sum(sys.getsizeof(i) for i in app.segments)
+    template = getattr(app, "template", None)
+    if template is not None:
+        n += sys.getsizeof(getattr(template, "txt", ""))
+    for i in (app.precompressed or {}).get("segments", []):
+        n += sys.getsizeof(i.deflated)
+    return n
+
+
+class Registry:
+    """
+        Instances are evicted least recently used first when the estimated
+        total footprint exceeds maxsize. The most recently requested instance
+        is never evicted, so a single oversized entry still works.
+    """
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        # (class, minimized, dev) -> [instance, refcount]
+        self.cores = {}
+        # (class, minimized, dev) -> threading.Event, for cores being built
+        self.pending = {}
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, klass, domain, minimized, dev):
+        """
+            Returns a klass(domain, minimized, dev) instance, building it only
+            if necessary.
+        """
+        key = (klass, domain, minimized, dev)
+        corekey = (klass, minimized, dev)
+        counted = False
+        while 1:
+            self.lock.acquire()
+            try:
+                app = self.entries.pop(key, None)
+                if app is not None:
+                    self.entries[key] = app
+                    if not counted:
+                        self.hits += 1
+                    return app
+                if not counted:
+                    self.misses += 1
+                    counted = True
+                core = self.cores.get(corekey)
+                if core is not None:
+                    return self._add(key, core, core[0].withDomain(domain))
+                event = self.pending.get(corekey)
+                if event is None:
+                    event = self.pending[corekey] = threading.Event()
+                    break
+            finally:
+                self.lock.release()
+            event.wait()
+        try:
+            app = klass(domain, minimized, dev)
+        except:
+            self.lock.acquire()
+            try:
+                del self.pending[corekey]
+            finally:
+                self.lock.release()
+            event.set()
+            raise
+        self.lock.acquire()
+        try:
+            del self.pending[corekey]
+            core = self.cores[corekey] = [app, 0]
+            return self._add(key, core, app)
+        finally:
+            self.lock.release()
+            event.set()
+
+    def _add(self, key, core, app):
+        """
+            Adds an entry and evicts as needed. Must be called with the lock
+            held.
+        """
+        self.entries[key] = app
+        core[1] += 1
+        self._evict()
+        return app
+
+    def size(self):
+        """
+            Returns the estimated footprint of the shared compiled state plus
+            the per-domain instances. The compiled state grows if it's
+            precompressed, so this is recalculated every time.
+        """
+        n = sum(footprint(i[0]) for i in self.cores.values())
+        return n + sum(sys.getsizeof(vars(i)) for i in self.entries.values())
+
+    def _evict(self):
+        while len(self.entries) > 1 and self.size() > self.maxsize:
+            key, app = self.entries.popitem(last=False)
+            self.evictions += 1
+            corekey = (key[0], key[2], key[3])
+            core = self.cores[corekey]
+            core[1] -= 1
+            if not core[1]:
+                del self.cores[corekey]
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+            self.cores.clear()
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        self.lock.acquire()
+        try:
+            return dict(
+                hits = self.hits,
+                misses = self.misses,
+                evictions = self.evictions,
+                entries = len(self.entries),
+                cores = len(self.cores),
+                size = self.size(),
+            )
+        finally:
+            self.lock.release()
+
+
+default = Registry()
+
+
+def get(klass, domain, minimized, dev):
+    """
+        Returns a klass(domain, minimized, dev) instance from the default
+        registry.
+    """
+    return default.get(klass, domain, minimized, dev)
@@ -0,0 +1,94 @@
+"""
+    Lightweight per-stage instrumentation for building and rendering pads.
+
+    Stages record cumulative time, call counts and byte counts, both against
+    the process-wide Stats object and against the Stats of the Pad or
+    Converter doing the work. Recording is off unless enabled is set (or the
+    CRYPSR_STATS environment variable is), in which case the cost at each
+    instrumented point is a couple of function calls that return at once.
+
+    Hooks are callables that are called as hook(stage, elapsed, size) for
+    every recorded event, e.g. to feed an external metrics system.
+"""
+import os, time, threading
+
+enabled = bool(os.environ.get("CRYPSR_STATS"))
+hooks = []
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, elapsed, size):
+        self.lock.acquire()
+        try:
+            s = self.stages.get(stage)
+            if s is None:
+                s = self.stages[stage] = [0.0, 0, 0]
+            s[0] += elapsed
+            s[1] += 1
+            s[2] += size
+        finally:
+            self.lock.release()
+
+    def snapshot(self):
+        """
+            Returns a dictionary mapping stage names to dictionaries with
+            time, calls and bytes keys.
+        """
+        self.lock.acquire()
+        try:
+            return dict(
+                (k, dict(time=v[0], calls=v[1], bytes=v[2]))
+                for k, v in self.stages.items()
+            )
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.stages = {}
+        finally:
+            self.lock.release()
+
+
+process = Stats()
+
+
+def start():
+    """
+        Returns a start time to pass to stop, or None if recording is off.
+    """
+    if enabled:
+        return time.time()
+
+
+def stop(start, stage, size, local=None):
+    """
+        Records a stage that began at start, against the process-wide stats
+        and against local if it's given.
+    """
+    if start is None:
+        return
+    elapsed = time.time() - start
+    process.add(stage, elapsed, size)
+    if local is not None:
+        local.add(stage, elapsed, size)
+    for i in hooks:
+        i(stage, elapsed, size)
+
+
+def format(snapshot):
+    """
+        Formats a snapshot as a table, slowest stage first.
+    """
+    lines = ["%-12s %10s %8s %12s"%("stage", "time (s)", "calls", "bytes")]
+    items = sorted(snapshot.items(), key=lambda x: -x[1]["time"])
+    for k, v in items:
+        lines.append(
+            "%-12s %10.4f %8d %12d"%(k, v["time"], v["calls"], v["bytes"])
+        )
+    return "\n".join(lines)
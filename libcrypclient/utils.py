@@ -1,10 +1,17 @@
-import os.path, re
+import os.path, re, base64
 
 class Data:
+    """
+        Files read are cached in memory, and revalidated against their mtime,
+        size and inode on every read. As long as a file is unchanged, read
+        returns the same string object each time.
+    """
     def __init__(self, name):
         m = __import__(name, fromlist=".")
         dirname, _ = os.path.split(m.__file__)
         self.dirname = os.path.abspath(dirname)
+        # Maps full paths to ((mtime, size, inode), contents) tuples.
+        self.cache = {}
 
     def path(self, path):
         """
@@ -25,23 +32,95 @@ class Data:
 
             This function will raise ValueError if the path does not exist.
         """
-        p = self.path(path)
-        return open(p).read()
-
-
-def jsquote(s):
-    ret = []
-    for i in s:
-        if i == "\\":
-            ret.append(r"\\\\")
-        elif i == "\r":
-            ret.append(r"\r")
-        elif i == "\n":
-            ret.append(r"\n")
-        elif i in "\"\\'<>":
-            ret.append("\\" + i)
-        else:
-            ret.append(i)
-    return "".join(ret)
+        fullpath = os.path.join(self.dirname, path)
+        try:
+            st = os.stat(fullpath)
+        except OSError:
+            raise ValueError, "dataPath: %s does not exist."%fullpath
+        key = (st.st_mtime, st.st_size, st.st_ino)
+        cached = self.cache.get(fullpath)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        f = open(fullpath)
+        try:
+            d = f.read()
+        finally:
+            f.close()
+        self.cache[fullpath] = (key, d)
+        return d
+
+
+def utf8(s):
+    """
+        Returns s as UTF-8 encoded bytes. Strings are assumed to be UTF-8
+        already, and are returned as they are.
+    """
+    if isinstance(s, unicode):
+        return s.encode("utf-8")
+    return str(s)
+
+
+def decode(s):
+    """
+        Decodes UTF-8 bytes to unicode. Anything else is returned unchanged.
+    """
+    if isinstance(s, str):
+        return s.decode("utf-8")
+    return s
+
+
+_JSQUOTE = {
+    "\\": r"\\\\",
+    "\r": r"\r",
+    "\n": r"\n",
+    "\"": r'\"',
+    "'": r"\'",
+    "<": r"\<",
+    ">": r"\>",
+}
+_JSQUOTE_RE = re.compile(r"[\\\r\n\"'<>]")
+def jsquote(s, out=None):
+    """
+        Quotes s for inclusion in a double- or single-quoted Javascript string
+        literal. Runs of safe characters are copied through in bulk. Accepts
+        both str and unicode.
+
+        If out is given, the quoted string is written to it piecewise using
+        out.write, and None is returned.
+    """
+    if out is None:
+        return _JSQUOTE_RE.sub(lambda m: _JSQUOTE[m.group()], s)
+    pos = 0
+    for m in _JSQUOTE_RE.finditer(s):
+        out.write(s[pos:m.start()])
+        out.write(_JSQUOTE[m.group()])
+        pos = m.end()
+    out.write(s[pos:])
+
+
+# Characters that could end a <script> data block, or that the HTML parser
+# would rewrite inside one.
+_DATAUNSAFE = ["<", "\r", "\x00"]
+
+def dataquote(s):
+    """
+        Encodes s as the text of an inert <script> data block, to be read
+        back by embeddedData in pad.js and converter.js. If s contains none
+        of the few characters that are unsafe there, it's included verbatim
+        after a "raw:" prefix, so the common case costs a few fast scans.
+        Otherwise its UTF-8 encoding is base64-encoded, after a "base64:"
+        prefix. The empty string is left empty.
+    """
+    if not s:
+        return s
+    for i in _DATAUNSAFE:
+        if i in s:
+            break
+    else:
+        return "raw:" + s
+    if isinstance(s, unicode):
+        s = s.encode("utf-8")
+    return "base64:" + base64.b64encode(s)
+
 
 data = Data(__name__)
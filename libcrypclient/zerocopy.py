@@ -0,0 +1,151 @@
+"""
+    Writing rendered pages to files and sockets with the static segments
+    copied by the kernel from a file on disk, so that only the dynamic slot
+    values are written from Python memory.
+
+    The static segments of a compiled application are written once, back to
+    back, to a file named after the template fingerprint. Pages are then
+    written with sendfile(2), straight from that file to the destination
+    descriptor. Python 2 has no os.sendfile, so on Linux the libc call is
+    used through ctypes; ctypes releases the GIL for the duration of the
+    call. Where sendfile isn't available, or the destination doesn't support
+    it, segments are written from memory instead.
+
+    Destinations must be blocking.
+"""
+import os, os.path, sys, errno, tempfile
+
+
+def _libcSendfile():
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        f = getattr(libc, "sendfile64", None) or libc.sendfile
+    except (ImportError, OSError, AttributeError):
+        return None
+    f.argtypes = [
+        ctypes.c_int, ctypes.c_int,
+        ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t
+    ]
+    f.restype = ctypes.c_ssize_t
+    def sendfile(out, infd, offset, count):
+        off = ctypes.c_int64(offset)
+        ret = f(out, infd, ctypes.byref(off), count)
+        if ret < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        return ret
+    return sendfile
+
+
+if hasattr(os, "sendfile"):
+    sendfile = os.sendfile
+elif sys.platform.startswith("linux"):
+    sendfile = _libcSendfile()
+else:
+    sendfile = None
+
+
+def writeall(fd, s):
+    """
+        Writes all of s to a file descriptor.
+    """
+    view = memoryview(s)
+    while view:
+        try:
+            n = os.write(fd, view)
+        except OSError, e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        view = view[n:]
+
+
+def fileno(f):
+    """
+        Returns the file descriptor of a file-like object, flushing it first,
+        or None if it doesn't have one.
+    """
+    try:
+        fd = f.fileno()
+    except (AttributeError, IOError, ValueError):
+        return None
+    if hasattr(f, "flush"):
+        f.flush()
+    return fd
+
+
+class Static:
+    """
+        The static segments of a compiled application, in a file opened for
+        reading. Instances are shared between threads; the file position is
+        never used. The file is closed when the instance is freed, or by
+        close, after which send always returns False. Don't close an instance
+        while another thread may be sending from it.
+    """
+    def __init__(self, path, segments):
+        self.path = path
+        self.offsets = []
+        pos = 0
+        for i in segments:
+            self.offsets.append((pos, len(i)))
+            pos += len(i)
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size != pos:
+            self.file.close()
+            raise ValueError, "Static segment file is truncated: %s"%path
+
+    def close(self):
+        self.file.close()
+
+    def send(self, fd, index):
+        """
+            Sends segment index to fd with sendfile. Returns False if
+            sendfile can't be used with fd, or the instance is closed, in
+            which case nothing was sent.
+        """
+        if self.file.closed:
+            return False
+        offset, count = self.offsets[index]
+        infd = self.file.fileno()
+        while count:
+            try:
+                n = sendfile(fd, infd, offset, count)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno in (errno.EINVAL, errno.ENOSYS) and \
+                        offset == self.offsets[index][0]:
+                    return False
+                raise
+            if n == 0:
+                raise IOError, "Static segment file is truncated: %s"%self.path
+            offset += n
+            count -= n
+        return True
+
+
+def write(directory, name, segments):
+    """
+        Writes segments back to back to a file called name in directory,
+        unless a file of the right size is already there, and returns a
+        Static for it. The name should identify the content, e.g. by
+        including the template fingerprint.
+    """
+    path = os.path.join(directory, name)
+    size = sum(len(i) for i in segments)
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        try:
+            f = os.fdopen(fd, "wb")
+            try:
+                f.writelines(segments)
+            finally:
+                f.close()
+            os.chmod(tmp, 0644)
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+    return Static(path, segments)
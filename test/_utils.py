@@ -1,9 +1,16 @@
-import os, os.path, codecs
+import os, os.path, codecs, tempfile, shutil, atexit
 import libpry, cubictemp
-from libcrypclient import utils, pad
+from libcrypclient import utils, pad, mincache
 
 OUTDIR = "browser"
 
+# Minified components built by the tests are cached in a scratch directory
+# that is removed at exit, rather than in the user's cache, so that page tests
+# never pass on stale entries.
+CACHEDIR = tempfile.mkdtemp(prefix="crypsr-test-")
+atexit.register(shutil.rmtree, CACHEDIR, True)
+mincache.cache = mincache.MinCache(CACHEDIR)
+
 testdata = utils.Data(__name__)
 
 
@@ -0,0 +1,49 @@
+import libpry
+from libcrypclient import analyze, pad
+import _utils
+
+
+class uAnalyze(libpry.AutoTree):
+    def test_analyze(self):
+        for minimized in [True, False]:
+            l = pad.Pad("test", minimized, False)
+            page = l.existing("name", "")
+            r = analyze.analyze(l, page)
+            names = [i["name"] for i in r["components"]]
+            assert names[0] == "contrib/sjcl.js"
+            assert "pad.css" in names
+            t = r["total"]
+            assert t["page"] == len(page)
+            assert t["components"] + t["other"] == len(page)
+            for i in r["components"]:
+                assert i["gzip"] < i["minified"] <= i["raw"]
+            assert 0 < sum(i["share"] for i in r["components"]) < 1
+
+    def test_cssopt(self):
+        l = pad.Pad("test", True, False, cssopt=True)
+        page = l.existing("name", "")
+        t = analyze.analyze(l, page)["total"]
+        assert t["cssopt"] == l.cssreport["before"] - l.cssreport["after"]
+        assert t["components"] + t["other"] == len(page)
+
+    def test_check(self):
+        r = dict(
+            components = [dict(name="a.js", minified=100, gzip=50)],
+            total = dict(page=1000, gzip=500)
+        )
+        assert not analyze.check(r, {})
+        assert not analyze.check(r, dict(total=dict(page=1000)))
+        errors = analyze.check(r, dict(
+            total = dict(page=999, gzip=500),
+            components = {
+                "a.js": dict(gzip=49, foo=1),
+                "b.js": dict(gzip=1),
+            }
+        ))
+        assert len(errors) == 4
+        assert "over budget by 1" in errors[0]
+
+
+tests = [
+    uAnalyze()
+]
@@ -0,0 +1,140 @@
+import httplib, urllib, zlib, re, shutil, tempfile
+import libpry
+from libcrypclient import backend, pad
+import _utils
+
+CIPHERTEXT = '{"iv":"abc","ct":"def+/="}'
+
+
+class uStore(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _check(self, store):
+        assert store.load("foo") is None
+        assert store.save("foo", "a"*40, "one")
+        assert store.load("foo") == "one"
+        assert not store.save("foo", "b"*40, "two")
+        assert store.save("foo", "a"*40, "two\nthree")
+        assert store.load("foo") == "two\nthree"
+
+    def test_memory(self):
+        self._check(backend.MemoryStore())
+
+    def test_file(self):
+        self._check(backend.FileStore(self.tmpdir))
+        assert backend.FileStore(self.tmpdir).load("foo") == "two\nthree"
+
+
+class uBackend(libpry.AutoTree):
+    def setUp(self):
+        self.backend = backend.Backend(
+            backend.MemoryStore(), app=pad.Pad("test", False, False),
+            workers=2
+        )
+        self.backend.start()
+        self.conn = httplib.HTTPConnection("127.0.0.1", self.backend.port)
+
+    def tearDown(self):
+        self.conn.close()
+        self.backend.stop()
+
+    def _request(self, method, path, body=None, headers={}):
+        self.conn.request(method, path, body, headers)
+        r = self.conn.getresponse()
+        return r, r.read()
+
+    def _save(self, name, key, data):
+        return self._request(
+            "POST", "/_save",
+            urllib.urlencode(dict(name=name, key=key, data=data)),
+            {"Content-Type": "application/x-www-form-urlencoded"}
+        )
+
+    def test_cycle(self):
+        r, page = self._request("GET", "/foo")
+        assert r.status == 200
+        assert 'var domain = "%s";'%self.backend.domain in page
+        key = re.search(r'var new_writekey = "(\w+)";', page).group(1)
+        assert len(key) == 40
+        r, body = self._save("foo", key, CIPHERTEXT)
+        assert (r.status, body) == (200, "OK")
+        r, page = self._request("GET", "/foo")
+        assert page == self.backend.pad.existing("foo", CIPHERTEXT)
+        assert r.getheader("connection") != "close"
+
+        r, body = self._save("foo", "x"*40, "other")
+        assert r.status == 403
+        r, body = self._save("foo", "short", "other")
+        assert r.status == 403
+        r, body = self._save("foo", key, "x"*(pad.PAD_SIZE_LIMIT + 1))
+        assert r.status == 413
+        r, body = self._save("_save", key, "x")
+        assert r.status == 400
+        r, body = self._request("GET", "/_save")
+        assert r.status == 404
+
+    def test_conditional(self):
+        key = "k"*40
+        self._save("foo", key, CIPHERTEXT)
+        r, page = self._request("GET", "/foo", headers={"Accept-Encoding": "gzip"})
+        assert r.getheader("content-encoding") == "gzip"
+        assert zlib.decompress(page, 16 + zlib.MAX_WBITS) == \
+               self.backend.pad.existing("foo", CIPHERTEXT)
+        etag = r.getheader("etag")
+        r, page = self._request(
+            "GET", "/foo",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert r.status == 304
+        assert page == ""
+        assert r.getheader("content-length") is None
+        assert r.getheader("content-type") is None
+        assert r.getheader("etag") == etag
+        r, page = self._request(
+            "GET", "/foo", headers={"Accept-Encoding": "gzip;q=0, deflate"}
+        )
+        assert r.getheader("content-encoding") is None
+        assert page == self.backend.pad.existing("foo", CIPHERTEXT)
+
+    def test_length(self):
+        for length in [None, "x", "-1"]:
+            c = httplib.HTTPConnection("127.0.0.1", self.backend.port)
+            c.putrequest("POST", "/_save")
+            if length is not None:
+                c.putheader("Content-Length", length)
+            c.endheaders()
+            r = c.getresponse()
+            assert r.status == 400
+            r.read()
+            c.close()
+
+    def test_head(self):
+        self._save("foo", "k"*40, CIPHERTEXT)
+        r, page = self._request("HEAD", "/foo")
+        assert r.status == 200
+        assert page == ""
+        assert int(r.getheader("content-length")) == \
+               len(self.backend.pad.existing("foo", CIPHERTEXT))
+        # The connection is still usable.
+        r, page = self._request("GET", "/foo")
+        assert page == self.backend.pad.existing("foo", CIPHERTEXT)
+
+    def test_accepts(self):
+        assert backend.accepts("gzip", "gzip")
+        assert backend.accepts("deflate, GZIP;q=0.5", "gzip")
+        assert backend.accepts("*", "gzip")
+        assert not backend.accepts(None, "gzip")
+        assert not backend.accepts("deflate", "gzip")
+        assert not backend.accepts("gzip;q=0", "gzip")
+        assert not backend.accepts("gzip; q=0.000, *", "gzip")
+        assert not backend.accepts("*;q=0", "gzip")
+
+
+tests = [
+    uStore(),
+    uBackend(),
+]
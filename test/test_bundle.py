@@ -0,0 +1,56 @@
+import os, os.path, shutil, tempfile
+import libpry
+from libcrypclient import bundle, pad
+import _utils
+
+
+class uBundle(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        p = os.path.join(self.tmpdir, "bundle")
+        bundle.write(p, dict(foo="bar"), ["one", "", "\x00two"])
+        meta, segments = bundle.load(p)
+        assert meta["foo"] == "bar"
+        assert segments == ["one", "", "\x00two"]
+
+    def test_invalid(self):
+        p = os.path.join(self.tmpdir, "bundle")
+        f = open(p, "wb")
+        f.write("not a bundle at all")
+        f.close()
+        libpry.raises("not a bundle", bundle.load, p)
+        bundle.write(p, {}, ["one", "two"])
+        f = open(p, "r+b")
+        f.truncate(os.path.getsize(p) - 1)
+        f.close()
+        libpry.raises("truncated", bundle.load, p)
+
+    def test_from_bundle(self):
+        blob = "".join(chr(i) for i in range(255))
+        p = os.path.join(self.tmpdir, "bundle")
+        l = pad.Pad("test", True, False)
+        l.writeBundle(p)
+        b = pad.Pad.from_bundle(p)
+        assert b.existing("name", blob) == l.existing("name", blob)
+        assert b.new("name", "key") == l.new("name", "key")
+        assert b.hash_existing("name", blob) == l.hash_existing("name", blob)
+        assert b.etag("name", blob) == l.etag("name", blob)
+        assert "components/pad.js" in b.digests
+        b = pad.Pad.from_bundle(p, "other")
+        assert b.existing("name", blob) == l.withDomain("other").existing("name", blob)
+        libpry.raises("not Converter", pad.Converter.from_bundle, p)
+
+        c = pad.Converter("test", True, False)
+        c.writeBundle(p)
+        b = pad.Converter.from_bundle(p)
+        assert b.render("name", blob) == c.render("name", blob)
+
+
+tests = [
+    uBundle()
+]
@@ -0,0 +1,35 @@
+import random, zlib, gzip, StringIO
+import libpry
+from libcrypclient import compress
+
+
+class uCompress(libpry.AutoTree):
+    def test_combine(self):
+        r = random.Random(0)
+        for i in range(50):
+            a = "".join(chr(r.randint(0, 255)) for i in range(r.randint(0, 300)))
+            b = "".join(chr(r.randint(0, 255)) for i in range(r.randint(0, 300)))
+            crc = compress.crc32Combine(
+                zlib.crc32(a) & 0xffffffff, zlib.crc32(b) & 0xffffffff,
+                compress.crc32Shift(len(b))
+            )
+            assert crc == zlib.crc32(a + b) & 0xffffffff
+            adler = compress.adler32Combine(
+                zlib.adler32(a) & 0xffffffff, zlib.adler32(b) & 0xffffffff, len(b)
+            )
+            assert adler == zlib.adler32(a + b) & 0xffffffff
+
+    def test_splice(self):
+        s = compress.Splicer()
+        pieces = [s.segment("one" * 100), "", "two", s.segment(""), s.segment("three")]
+        plain = "one" * 100 + "twothree"
+        z = "".join(s.splice(pieces))
+        assert gzip.GzipFile(fileobj=StringIO.StringIO(z)).read() == plain
+        assert zlib.decompress("".join(s.splice(pieces, "deflate"))) == plain
+        assert zlib.decompress("".join(s.splice([], "gzip")), 31) == ""
+        libpry.raises(ValueError, s.splice, pieces, "br")
+
+
+tests = [
+    uCompress()
+]
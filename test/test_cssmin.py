@@ -0,0 +1,28 @@
+import libpry
+from libcrypclient import cssmin
+
+
+class uCSSMin(libpry.AutoTree):
+    def test_remove_comments(self):
+        assert cssmin.remove_comments("a/* x */b/* y */c") == "abc"
+        assert cssmin.remove_comments("a/*! x */b") == "a/*! x */b"
+        assert cssmin.remove_comments("a/* x \\*/b/* y */c/* z */") == "a/* x \\*/b/* y */c"
+        assert cssmin.remove_comments("a/* x") == "a"
+
+    def test_pseudoclasscolon(self):
+        assert cssmin.cssmin("p :link {color: red} a :hover {x: y}") == \
+            "p :link{color:red}a :hover{x:y}"
+
+    def test_rgb(self):
+        assert cssmin.normalize_rgb_colors_to_hex("rgb(51,102,153) rgb( 0, 0, 0 )") == \
+            "#336699 #000000"
+
+    def test_condense_hex_colors(self):
+        assert cssmin.condense_hex_colors("a{color:#AABBCC;b:#aabbcd;c:#001122}") == \
+            "a{color:#ABC;b:#aabbcd;c:#012}"
+        assert cssmin.condense_hex_colors("a{color:=#aabbcc}") == "a{color:=#aabbcc}"
+
+
+tests = [
+    uCSSMin(),
+]
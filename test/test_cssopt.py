@@ -0,0 +1,83 @@
+import libpry
+from libcrypclient import cssopt, pad
+import _utils
+
+
+class uCSSOpt(libpry.AutoTree):
+    def test_parse(self):
+        nodes = cssopt.parse(
+            'a,b{color:red;content:"};"}@media print{a{x:y}}/*!c*/p{}'
+        )
+        assert nodes == [
+            ("rule", ["a", "b"], ["color:red", 'content:"};"']),
+            ("raw", "@media print{a{x:y}}"),
+            ("raw", "/*!c*/"),
+            ("rule", ["p"], []),
+        ]
+        assert cssopt.serialize(nodes) == \
+            'a,b{color:red;content:"};"}@media print{a{x:y}}/*!c*/p{}'
+        libpry.raises(cssopt.ParseError, cssopt.parse, "a{b:c")
+        libpry.raises(cssopt.ParseError, cssopt.parse, "a{b:'c}")
+
+    def test_used(self):
+        words = cssopt.words(['<div class="foo" id="bar">', "x = 'yui-';"])
+        prefixes = ("yui-",)
+        assert cssopt.used("div", words, prefixes)
+        assert cssopt.used("#bar .foo:hover", words, prefixes)
+        assert cssopt.used("div.yui-gb", words, prefixes)
+        assert cssopt.used("a[href$='.pdf']", words, prefixes)
+        assert cssopt.used("a:not(.baz)", words, prefixes)
+        assert not cssopt.used(".foo .baz", words, prefixes)
+        assert not cssopt.used("#baz", words, prefixes)
+
+    def test_prune(self):
+        css, r = cssopt.optimize(["a{x:y}", ".foo,.bar{x:z}"], set(["foo"]))
+        assert css == "a{x:y}.foo{x:z}"
+        assert r["pruned"] == 1
+        css, r = cssopt.optimize([".bar{x:z}"], set())
+        assert css == ""
+        assert r == dict(before=9, after=0, pruned=1, merged=0)
+
+    def test_merge_selectors(self):
+        css, r = cssopt.optimize(["a{color:red}", "p{x:y}a{margin:0}"], set())
+        assert css == "p{x:y}a{color:red;margin:0}"
+        assert r["merged"] == 1
+        # A rule in between sets a conflicting property.
+        s = "a{margin:0}p{margin-left:1px}a{color:red}"
+        assert cssopt.optimize([s], set())[0] == s
+        s = "a{font:1em x}p{line-height:2}a{color:red}"
+        assert cssopt.optimize([s], set())[0] == s
+        # At-rules and vendor selectors are barriers.
+        s = "a{color:red}@media print{p{x:y}}a{margin:0}"
+        assert cssopt.optimize([s], set())[0] == s
+        s = "a::selection{color:red}p{x:y}a::selection{margin:0}"
+        assert cssopt.optimize([s], set())[0] == s
+
+    def test_merge_bodies(self):
+        css, r = cssopt.optimize(["a{x:y}p{z:w}", "b{x:y}"], set())
+        assert css == "p{z:w}a,b{x:y}"
+        assert r["merged"] == 1
+        s = "a{x:y}p{x:z}b{x:y}"
+        assert cssopt.optimize([s], set())[0] == s
+
+    def test_unparseable(self):
+        css, r = cssopt.optimize(["a{x:y}", ".foo{x:'y}"], set())
+        assert css == "a{x:y}.foo{x:'y}"
+        assert r["after"] == r["before"]
+
+    def test_pad(self):
+        for klass in [pad.Pad, pad.Converter]:
+            l = klass("test", True, False, cssopt=True)
+            r = l.cssreport
+            assert r["pruned"]
+            assert 0 < r["after"] < r["before"]
+            page = l.existing("name", "") if klass is pad.Pad \
+                   else l.render("name", "")
+            assert page.count("<style>") == 1
+            assert "yui-t1" not in page
+            assert "<style>html{" in page
+
+
+tests = [
+    uCSSOpt()
+]
@@ -0,0 +1,76 @@
+import glob, os.path
+import libpry
+from libcrypclient import jsmangle, jsmin, pad, utils
+import _utils
+
+
+class uJSMangle(libpry.AutoTree):
+    def test_simple(self):
+        js = "function foo(alpha,beta){var gamma=alpha+beta;return gamma*beta}"
+        m = jsmangle.mangle(js)
+        assert m.startswith("function foo(")
+        assert "alpha" not in m and "gamma" not in m
+        assert len(m) < len(js)
+        assert jsmangle.bindings(m) == jsmangle.bindings(js)
+
+    def test_kept(self):
+        js = """var top=1;function f(local){
+            var o={local:local,key:top};
+            o.local=local;
+            Data.x=List;
+            label:for(;;){break label}
+            return ciphertext+name+domain+window.local}"""
+        m = jsmangle.mangle(js)
+        for i in ["var top=1", "={local:", ".local=", "Data.x=List", "label:",
+                  "break label", "ciphertext+name+domain+window.local"]:
+            assert i in m
+        assert "{local:local" not in m
+
+    def test_unsafe(self):
+        for js in [
+            "function f(alpha){return eval('alpha')}",
+            "function f(alpha){with(alpha){return beta}}",
+            "function f(alpha){function g(){eval('x')}return alpha}",
+            "var x = 'unterminated",
+        ]:
+            assert jsmangle.mangle(js) == js
+
+    def test_capture(self):
+        js = "function f(alpha){return a+alpha}"
+        m = jsmangle.mangle(js)
+        assert "return a+" in m
+        assert jsmangle.bindings(m) == jsmangle.bindings(js)
+
+    def test_regex(self):
+        js = "function f(alpha){return /alpha/.test(alpha)&&alpha/2}"
+        m = jsmangle.mangle(js)
+        assert "/alpha/.test(" in m
+        assert m.count("alpha") == 1
+
+    def test_components(self):
+        # Every bundled component keeps its binding structure, so the mangled
+        # code differs from the original only by a consistent renaming.
+        d = utils.data.path("components")
+        files = glob.glob(os.path.join(d, "*.js"))
+        files += glob.glob(os.path.join(d, "contrib", "*.js"))
+        for f in files:
+            js = jsmin.jsmin(open(f).read())
+            m = jsmangle.mangle(js)
+            assert len(m) < len(js), f
+            assert jsmangle.bindings(m) == jsmangle.bindings(js), f
+            names = lambda s: [
+                t for k, t in jsmangle.tokenize(s) if k != "name"
+            ]
+            assert names(m) == names(js), f
+
+    def test_pad(self):
+        l = pad.Pad("test", True, False)
+        m = pad.Pad("test", True, False, mangle=True)
+        page = m.existing("name", "data")
+        assert len(page) < len(l.existing("name", "data"))
+        assert m.hash_existing("name", "data") == pad.hash(page, True)
+
+
+tests = [
+    uJSMangle()
+]
@@ -0,0 +1,58 @@
+import os, glob, random
+from StringIO import StringIO
+import libpry
+from libcrypclient import jsmin, utils
+
+
+def crockford(js):
+    outs = StringIO()
+    try:
+        jsmin.JavascriptMinify().minify(StringIO(js), outs)
+    except Exception, v:
+        return v.__class__
+    return outs.getvalue()
+
+
+def buffered(js):
+    try:
+        return jsmin.BufferedMinify().minifyString(js)
+    except Exception, v:
+        return v.__class__
+
+
+class uBufferedMinify(libpry.AutoTree):
+    def test_components(self):
+        d = utils.data.path("components")
+        paths = glob.glob(os.path.join(d, "*.js"))
+        paths += glob.glob(os.path.join(d, "contrib", "*.js"))
+        assert paths
+        for p in paths:
+            d = open(p).read()
+            assert buffered(d) == crockford(d)
+
+    def test_errors(self):
+        assert buffered("a = 'foo") == jsmin.UnterminatedStringLiteral
+        assert buffered("a = /foo") == jsmin.UnterminatedRegularExpression
+        assert buffered("a /* foo") == jsmin.UnterminatedComment
+
+    def test_random(self):
+        tokens = [
+            "a", "b1", "$", "\\", " ", "  ", "\n", "\r", "\t", "\x00", "/",
+            "//", "/*", "*/", "*", '"', "'", "(", ")", ",", "=", ":", "[",
+            "]", "?", "!", "&", "|", ";", "{", "}", "+", "-", ".", "\xe9",
+            "/re/g", '"s\\"t"', "'q'", "\\n", "\\\n",
+        ]
+        r = random.Random(0)
+        for i in range(5000):
+            n = r.randint(0, 30)
+            js = "".join(r.choice(tokens) for j in range(n))
+            assert buffered(js) == crockford(js)
+
+    def test_jsmin(self):
+        assert jsmin.jsmin("\n\nvar a = 1;\n") == "var a=1;"
+        assert jsmin.jsmin(u"var a = 'b';") == u"var a='b';"
+
+
+tests = [
+    uBufferedMinify(),
+]
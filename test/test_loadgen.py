@@ -0,0 +1,98 @@
+import random, json
+import libpry
+from libcrypclient import loadgen, pad
+import _utils
+
+
+class uHistogram(libpry.AutoTree):
+    def test_percentile(self):
+        h = loadgen.Histogram()
+        assert h.percentile(50) == 0.0
+        for i in range(1, 101):
+            h.add(i / 1000.0)
+        assert h.count == 100
+        assert h.max == 0.1 and h.min == 0.001
+        assert 0.05 <= h.percentile(50) <= 0.05 * 1.06
+        assert 0.099 <= h.percentile(99) <= 0.1
+        assert h.percentile(100) == 0.1
+
+    def test_merge(self):
+        a, b = loadgen.Histogram(), loadgen.Histogram()
+        a.add(0.001)
+        b.add(0.01)
+        b.add(0.02)
+        a.merge(b)
+        s = a.summary()
+        assert s["count"] == 3
+        assert s["min"] == 0.001 and s["max"] == 0.02
+        assert sum(n for _, n in s["histogram"]) == 3
+
+
+class uParse(libpry.AutoTree):
+    def test_sizes(self):
+        r = random.Random(0)
+        assert loadgen.parseSizes("1024")(r) == 1024
+        f = loadgen.parseSizes("10:1,20:0")
+        assert set(f(r) for i in range(20)) == set([10])
+        f = loadgen.parseSizes("uniform:5:10")
+        assert all(5 <= f(r) <= 10 for i in range(20))
+        f = loadgen.parseSizes("lognormal:1000:10")
+        assert all(0 <= f(r) <= pad.PAD_SIZE_LIMIT for i in range(20))
+        limit = pad.PAD_SIZE_LIMIT
+        assert loadgen.parseSizes(str(limit * 2))(r) == limit
+        assert loadgen.parseSizes("uniform:%s:%s"%(limit * 2, limit * 3))(r) == limit
+        for i in ["", "x", "-1", "10:-1", "uniform:10:5", "lognormal:0:1"]:
+            libpry.raises("invalid size", loadgen.parseSizes, i)
+
+    def test_weights(self):
+        assert loadgen.parseWeights("new,hash:2") == [("new", 1), ("hash", 2)]
+        libpry.raises(ValueError, loadgen.parseWeights, "new:0")
+
+    def test_ciphertext(self):
+        blob = loadgen.ciphertext(1000, random.Random(0))
+        assert 996 < len(blob) <= 1000
+        assert json.loads(blob)["ct"]
+        assert blob == loadgen.ciphertext(1000, random.Random(0))
+        limit = pad.PAD_SIZE_LIMIT
+        r = random.Random(0)
+        for size in range(limit - 4, limit + 1):
+            assert len(loadgen.ciphertext(size, r)) <= limit
+        size = loadgen.parseSizes(str(limit * 2))(r)
+        assert limit - 4 < len(loadgen.ciphertext(size, r)) <= limit
+        assert json.loads(loadgen.ciphertext(0, r))["ct"] == ""
+
+
+class uRun(libpry.AutoTree):
+    def test_run(self):
+        p = pad.Pad("test", False, False)
+        c = pad.Converter("test", False, False)
+        w = loadgen.Workload(
+            p, c, loadgen.parseSizes("100"),
+            loadgen.parseWeights("existing,new,render,hash"), samples=4
+        )
+        results = [
+            loadgen.run(w, "thread", 1, 0.2),
+            loadgen.run(w, "thread", 2, 0.2),
+            loadgen.run(w, "process", 2, 0.2),
+        ]
+        loadgen.scaling(results)
+        for r in results:
+            assert r["operations"] == r["latency"]["count"] > 0
+            assert sorted(r["ops"]) == sorted(loadgen.OPERATIONS)
+            assert r["throughput"] > 0
+        assert results[0]["efficiency"] == 1.0
+        assert results[2]["efficiency"] == 1.0
+        assert "thread" in loadgen.format(results)
+        json.dumps(results)
+        libpry.raises("unknown", loadgen.run, w, "fibre", 1, 0.1)
+        libpry.raises(
+            "unknown operation", loadgen.Workload,
+            p, c, loadgen.parseSizes("100"), [("save", 1)]
+        )
+
+
+tests = [
+    uHistogram(),
+    uParse(),
+    uRun(),
+]
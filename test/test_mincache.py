@@ -0,0 +1,73 @@
+import os, tempfile, shutil, time
+import libpry
+from libcrypclient import mincache, pad
+
+
+class uMinCache(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.c = mincache.MinCache(os.path.join(self.tmpdir, "cache"), 100)
+        self.c.enabled = True
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_getput(self):
+        assert self.c.get("js", "foo", []) is None
+        self.c.put("js", "foo", [], "bar")
+        assert self.c.get("js", "foo", []) == "bar"
+        assert self.c.get("css", "foo", []) is None
+        assert self.c.get("js", "foo", [(0, 1)]) is None
+        assert self.c.stats() == dict(hits=1, misses=3, evictions=0, saved=3)
+
+    def test_evict(self):
+        for i in range(5):
+            self.c.put("js", str(i), [], "x"*30)
+            t = time.time() - 100 + i
+            os.utime(os.path.join(self.c.path, self.c.key("js", str(i), [])), (t, t))
+        self.c.evict()
+        assert self.c.evictions
+        assert self.c.get("js", "0", []) is None
+        assert self.c.get("js", "4", []) == "x"*30
+        assert sum(i[1] for i in self.c.entries()) <= 100
+
+    def test_scan(self):
+        scans = []
+        entries = self.c.entries
+        def counted():
+            scans.append(1)
+            return entries()
+        self.c.entries = counted
+        self.c.maxsize = 1000
+        for i in range(10):
+            self.c.put("js", str(i), [], "x"*10)
+        assert len(scans) == 1
+        self.c.put("js", "big", [], "x"*1000)
+        assert len(scans) == 2
+        assert self.c.evictions
+        assert sum(i[1] for i in entries()) == self.c.size <= 1000
+        assert not [i for i in os.listdir(self.c.path) if i.startswith(".")]
+
+    def test_disabled(self):
+        self.c.enabled = False
+        self.c.put("js", "foo", [], "bar")
+        assert self.c.get("js", "foo", []) is None
+        assert not self.c.entries()
+
+    def test_pad(self):
+        old = mincache.cache
+        try:
+            self.c.maxsize = mincache.DEFAULT_MAXSIZE
+            mincache.cache = self.c
+            a = pad.Pad("test", True, False).existing("name", "blob")
+            assert self.c.misses and not self.c.hits
+            b = pad.Pad("test", True, False).existing("name", "blob")
+            assert self.c.hits
+            assert a == b
+        finally:
+            mincache.cache = old
+
+
+tests = [
+    uMinCache(),
+]
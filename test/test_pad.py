@@ -1,7 +1,8 @@
 import os
 import textwrap
+import zlib
 import libpry
-from libcrypclient import pad
+from libcrypclient import pad, mincache
 import _utils
 
 class usnip(libpry.AutoTree):
@@ -28,11 +29,206 @@ class uPad(libpry.AutoTree):
         assert l.existing("name", "blob")
         assert l.new("name", "blob")
 
+    def test_utf8(self):
+        for l in [pad.Pad("test", True, False), pad.Pad("test", False, False, embed=True)]:
+            page = l.existing(u"caf\u00e9", u"\u00e9<")
+            assert type(page) is str
+            assert page == l.existing("caf\xc3\xa9", "\xc3\xa9<")
+            assert "caf\xc3\xa9" in page
+            assert type(l.new("name", "key")) is str
+            assert l.hash_existing(u"\u00e9", u"\u00e9") == pad.hash(page, True)
+            assert str(l.document_existing(u"n", u"\u00e9")) == l.existing("n", u"\u00e9")
+
+    def test_compile(self):
+        l = pad.Pad("test", True, True)
+        slots = [i[1] for i in l.slots]
+        assert sorted(slots) == ["data", "domain", "name", "writekey"]
+        t = l.template(name="<name>", writekey="")
+        t = str(t).replace(l.CIPHERMARKER, "blob").replace(l.DOMAINMARKER, "test")
+        assert l.existing("<name>", "blob") == t
+
+    def test_parallel(self):
+        # Bypass the cache, so that the pool does the minification.
+        c = mincache.cache
+        old, c.enabled = c.enabled, False
+        try:
+            a = pad.Pad("test", True, False).existing("name", "blob")
+            b = pad.Pad("test", True, False, processes=2).existing("name", "blob")
+            assert a == b
+            a = pad.Converter("test", True, False).render("name", "blob")
+            b = pad.Converter("test", True, False, processes=2).render("name", "blob")
+            assert a == b
+        finally:
+            c.enabled = old
+
+    def test_iter(self):
+        blob = "".join(chr(i) for i in range(255))
+        l = pad.Pad("test", True, False)
+        chunks = list(l.iter_existing("<name>", blob))
+        assert all(chunks)
+        assert "".join(chunks) == l.existing("<name>", blob)
+        assert chunks[0] is l.segments[0]
+        assert "".join(l.iter_new("name", "key")) == l.new("name", "key")
+        c = pad.Converter("test", True, False)
+        assert "".join(c.iter_render("name", blob)) == c.render("name", blob)
+
     def test_hash(self):
         l = pad.Pad("test", False, True)
         assert pad.hash(l.existing("name", "blob"), True)
         assert pad.hash(l.existing("name", "blob"), False)
 
+    def test_hash_existing(self):
+        blob = "".join(chr(i) for i in range(255))
+        for l in [pad.Pad("test", False, True), pad.Pad("test", True, False)]:
+            for name, data in [("name", blob), (pad.HOSTILEMARKER, pad.HOSTILEMARKER)]:
+                assert l.hash_existing(name, data) == pad.hash(l.existing(name, data), True)
+                assert l.hash_existing(name, data, False) == pad.hash(l.existing(name, data), False)
+            assert l.hash_new("name", "key") == pad.hash(l.new("name", "key"), True)
+        c = pad.Converter("test", True, False)
+        assert c.hash_render("name", blob) == pad.hash(c.render("name", blob), True)
+
+    def test_embed(self):
+        blob = "".join(chr(i) for i in range(255))
+        for l in [pad.Pad("test", True, False, embed=True),
+                  pad.Converter("test", True, False, embed=True)]:
+            render = getattr(l, "existing", None) or l.render
+            hash = getattr(l, "hash_existing", None) or l.hash_render
+            page = render("name", '{"ct":"abc"}')
+            assert 'id="ciphertext-data">raw:{"ct":"abc"}</script>' in page
+            assert "embeddedData(" in page
+            h = pad.hash(page, True)
+            for data in [blob, "</script>", pad.HOSTILEMARKER, ""]:
+                page = render("name", data)
+                assert pad.hash(page, True) == h
+                assert hash("name", data) == h
+                block = page.split('id="ciphertext-data">')[1]
+                assert "<" not in block[:block.index("</script>")]
+            assert h != pad.hash(pad.Pad("test", True, False).existing("name", ""), True)
+        # The reader is only shipped in embedded pages.
+        assert "embeddedData" not in pad.Pad("test", True, False).existing("name", "")
+        assert "embeddedData" not in pad.Converter("test", False, False).render("name", "")
+
+    def test_compileHash(self):
+        l = pad._App()
+        m = pad.HOSTILEMARKER
+        l.segments = ["a", "", "b%sc"%m, "", "d%se"%m, "", "f"]
+        l.slots = [(1, "name"), (3, "writekey"), (5, "data")]
+        l.zone = l.locateZone()
+        l.hashstate, l.hashpieces, l.hashchecks = l.compileHash()
+        assert l.hashpieces == ["name", "b", "e", "data", "f"]
+        for name, data in [("x", "y"), (m, ""), ("", m)]:
+            h = l._hash(name, "k", lambda: data, True)
+            assert h == pad.hash(l._render(name, "k", data), True)
+
+    def test_document(self):
+        blob = "".join(chr(i) for i in range(255))
+        l = pad.Pad("test", True, False)
+        for name, data in [("<name>", blob), (pad.HOSTILEMARKER, pad.HOSTILEMARKER)]:
+            d = l.document_existing(name, data)
+            page = l.existing(name, data)
+            assert str(d) == page
+            assert d.hostile == pad.locateHostile(page)
+            assert d.ciphertext().tobytes() == pad.utils.jsquote(data)
+            assert "".join(i.tobytes() for i in d.outside()) == pad.hostileBlock(page, "")
+            assert pad.hash(d, True) == pad.hash(page, True)
+        d = l.document_existing("<name>", "")
+        assert d.slot("name").tobytes() == "&lt;name&gt;"
+        d = l.document_new("name", "key")
+        assert str(d) == l.new("name", "key")
+        assert d.slot("writekey").tobytes() == "key"
+        c = pad.Converter("test", True, False)
+        assert str(c.document_render("name", blob)) == c.render("name", blob)
+
+    def test_compress(self):
+        blob = "".join(chr(i) for i in range(255))
+        l = pad.Pad("test", True, False)
+        for name, data in [("<name>", blob), ("name", "")]:
+            page = l.existing(name, data)
+            z = l.compress_existing(name, data)
+            assert z.startswith("\x1f\x8b")
+            assert zlib.decompress(z, 16 + zlib.MAX_WBITS) == page
+            assert zlib.decompress(l.compress_existing(name, data, "deflate")) == page
+        z = l.compress_new("name", "key")
+        assert zlib.decompress(z, 16 + zlib.MAX_WBITS) == l.new("name", "key")
+        libpry.raises("unknown encoding", l.compress_new, "name", "key", "br")
+        c = pad.Converter("test", True, False)
+        z = c.compress_render("name", blob, "deflate")
+        assert zlib.decompress(z) == c.render("name", blob)
+
+    def test_etag(self):
+        l = pad.Pad("test", True, False)
+        e = l.etag("name", "blob")
+        assert e.startswith('"') and e.endswith('"')
+        assert e == l.etag(u"name", "blob")
+        assert e != l.etag("name", "blob2")
+        assert e != l.etag("name2", "blob")
+        assert e == l.etag("name", u"blob")
+        assert e != l.etag("name", "blob", "gzip")
+        assert e != pad.Pad("test2", True, False).etag("name", "blob")
+        c = pad.Converter("test", True, False)
+        assert e != c.etag("name", "blob")
+
+    def test_notModified(self):
+        e = '"abc"'
+        assert not pad.notModified(e, None)
+        assert not pad.notModified(e, "")
+        assert pad.notModified(e, "*")
+        assert pad.notModified(e, '"abc"')
+        assert pad.notModified(e, 'W/"abc"')
+        assert pad.notModified(e, '"x", W/"abc" ,"y"')
+        assert not pad.notModified(e, '"x", "abcd"')
+        assert not pad.notModified(e, 'abc')
+
+    def test_withDomain(self):
+        blob = "".join(chr(i) for i in range(255))
+        l = pad.Pad("test", True, False)
+        o = l.withDomain("<other>")
+        assert o.segments is l.segments
+        assert o.domain == "<other>" and l.domain == "test"
+        assert o.existing("name", blob) == pad.Pad("<other>", True, False).existing("name", blob)
+        assert "&lt;other&gt;" in o.new("name", "key")
+        assert o.hash_existing("name", blob) == l.hash_existing("name", blob)
+        assert o.etag("name", blob) != l.etag("name", blob)
+        c = pad.Converter("test", True, False).withDomain("other")
+        assert c.render("name", blob) == pad.Converter("other", True, False).render("name", blob)
+
+    def test_refresh(self):
+        l = pad.Pad("test", True, False)
+        assert not l.refresh()
+        minified = []
+        def minifyAll(specs, processes=None):
+            minified.extend(specs)
+            return pad._App.minifyAll(l, specs, processes)
+        l.minifyAll = minifyAll
+        p = pad.utils.data.path("components/list.js")
+        key, d = pad.utils.data.cache[p]
+        pad.utils.data.cache[p] = (key, d + "\nvar refreshtest = 1;")
+        try:
+            assert l.refresh()
+            assert not l.refresh()
+        finally:
+            del pad.utils.data.cache[p]
+        assert len(minified) == 1
+        assert "refreshtest" in l.existing("name", "")
+        assert l.refresh()
+        assert len(minified) == 2
+        assert "refreshtest" not in l.existing("name", "")
+
+    def test_refresh_withDomain(self):
+        a = pad.Pad("test", False, False)
+        b = a.withDomain("other")
+        p = pad.utils.data.path("components/list.js")
+        key, d = pad.utils.data.cache[p]
+        pad.utils.data.cache[p] = (key, d + "\nvar refreshtest = 1;")
+        try:
+            assert b.refresh()
+            assert a.refresh()
+        finally:
+            del pad.utils.data.cache[p]
+        assert "refreshtest" in a.existing("name", "")
+        assert "refreshtest" in b.existing("name", "")
+        assert a.refresh() and b.refresh()
+
     def test_hostileBlock(self):
         ts = """
             pre
@@ -90,6 +286,11 @@ class uInjections(libpry.AutoTree):
             "<script>alert('hax');</script>",
         )
 
+    def test_embed(self):
+        f = open(os.path.join(_utils.OUTDIR, "pad_injections_embed.html"), "wb")
+        l = pad.Pad("test", False, False, embed=True)
+        f.write(l.existing("name", "</script><script>alert('hax');</script>"))
+
     def test_new(self):
         self._newPad(
             "pad_new.html",
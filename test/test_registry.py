@@ -0,0 +1,81 @@
+import threading, time
+import libpry
+from libcrypclient import registry, pad
+import _utils
+
+
+class Fake:
+    instances = 0
+    def __init__(self, domain, minimized, dev):
+        time.sleep(0.05)
+        Fake.instances += 1
+        self.domain = domain
+        self.segments = ["x" * 1000]
+        self.precompressed = {}
+
+    def withDomain(self, domain):
+        return pad._App.withDomain.im_func(self, domain)
+
+
+class uRegistry(libpry.AutoTree):
+    def setUp(self):
+        Fake.instances = 0
+
+    def test_get(self):
+        r = registry.Registry()
+        a = r.get(Fake, "one", True, False)
+        assert r.get(Fake, "one", True, False) is a
+        b = r.get(Fake, "two", True, False)
+        assert b is not a
+        assert b.domain == "two" and b.segments is a.segments
+        r.get(Fake, "one", False, False)
+        assert Fake.instances == 2
+        s = r.stats()
+        assert s["hits"] == 1
+        assert s["misses"] == 3
+        assert s["entries"] == 3
+        assert s["cores"] == 2
+
+    def test_singleflight(self):
+        r = registry.Registry()
+        results = []
+        def worker(domain):
+            results.append(r.get(Fake, domain, True, False))
+        threads = [
+            threading.Thread(target=worker, args=(i%3,)) for i in range(12)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert Fake.instances == 1
+        assert len(results) == 12
+        assert len(set(id(i) for i in results)) == 3
+        s = r.stats()
+        assert s["hits"] + s["misses"] == 12
+
+    def test_evict(self):
+        r = registry.Registry(maxsize=1)
+        r.get(Fake, "one", True, False)
+        r.get(Fake, "two", True, False)
+        s = r.stats()
+        assert s["entries"] == 1
+        assert s["evictions"] == 1
+        r.get(Fake, "one", False, False)
+        s = r.stats()
+        assert s["entries"] == 1 and s["cores"] == 1
+        assert Fake.instances == 2
+        r.clear()
+        assert not r.stats()["entries"]
+
+    def test_pad(self):
+        r = registry.Registry()
+        p = r.get(pad.Pad, "test", True, False)
+        o = r.get(pad.Pad, "other", True, False)
+        assert o.existing("name", "blob") == pad.Pad("other", True, False).existing("name", "blob")
+        assert r.stats()["size"] > registry.footprint(p)
+
+
+tests = [
+    uRegistry()
+]
@@ -0,0 +1,54 @@
+import libpry
+from libcrypclient import stats, pad
+import _utils
+
+
+class uStats(libpry.AutoTree):
+    def setUp(self):
+        self.enabled = stats.enabled
+        stats.process.reset()
+
+    def tearDown(self):
+        stats.enabled = self.enabled
+        stats.hooks = []
+
+    def test_disabled(self):
+        stats.enabled = False
+        l = pad.Pad("test", False, False)
+        l.existing("name", "blob")
+        assert not l.stats.snapshot()
+        assert not stats.process.snapshot()
+
+    def test_enabled(self):
+        stats.enabled = True
+        events = []
+        stats.hooks.append(lambda *args: events.append(args))
+        l = pad.Pad("test", False, False)
+        l.existing("name", "blob")
+        l.existing("name", "blob")
+        pad.hash(l.existing("name", "blob"), True)
+        s = l.stats.snapshot()
+        for i in ["read", "bootstrap", "template", "jsquote", "render"]:
+            assert i in s
+        assert s["render"]["calls"] == 3
+        assert s["jsquote"]["bytes"] == 12
+        p = stats.process.snapshot()
+        assert p["hash"]["calls"] == 1
+        assert "hash" not in s
+        assert len(events) == sum(i["calls"] for i in p.values())
+        assert "render" in stats.format(s)
+
+    def test_minify(self):
+        stats.enabled = True
+        local = stats.Stats()
+        pad.minify(("js", "var a = 1;\n", []), local)
+        pad.minify(("css", "a { color: red; }", []), local)
+        s = local.snapshot()
+        assert s["snip"]["calls"] == 1
+        assert s["jsmin"]["calls"] == 1
+        assert s["cssmin"]["calls"] == 1
+
+
+tests = [
+    uStats(),
+]
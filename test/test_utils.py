@@ -1,4 +1,5 @@
 # coding=utf-8
+import os, os.path, random, shutil, tempfile, StringIO
 import libpry
 from libcrypclient import utils
 import _utils
@@ -11,11 +12,52 @@ class JSQPage(_utils.TestPage):
         return data
         
 
+def refquote(s):
+    ret = []
+    for i in s:
+        if i == "\\":
+            ret.append(r"\\\\")
+        elif i == "\r":
+            ret.append(r"\r")
+        elif i == "\n":
+            ret.append(r"\n")
+        elif i in "\"\\'<>":
+            ret.append("\\" + i)
+        else:
+            ret.append(i)
+    return "".join(ret)
+
+
 class ujsquote(libpry.AutoTree):
     def test_one(self):
         assert utils.jsquote("") == ""
         assert utils.jsquote("a") == "a"
         assert utils.jsquote(r'"') == r'\"'
+        assert utils.jsquote("\\") == r"\\\\"
+        assert utils.jsquote("a\r\nb") == r"a\r\nb"
+        assert utils.jsquote("<'>") == r"\<\'\>"
+
+    def test_unicode(self):
+        s = u"\u00e9\"\n"
+        assert utils.jsquote(s) == refquote(s)
+
+    def test_out(self):
+        s = "one\ntwo \"three\" <four>\\"
+        out = StringIO.StringIO()
+        assert utils.jsquote(s, out) is None
+        assert out.getvalue() == utils.jsquote(s)
+
+    def test_random(self):
+        r = random.Random(0)
+        alphabet = "ab\\\r\n\"'<>\x00\xff"
+        for i in range(200):
+            s = "".join(r.choice(alphabet) for j in range(r.randint(0, 100)))
+            assert utils.jsquote(s) == refquote(s)
+            out = StringIO.StringIO()
+            utils.jsquote(s, out)
+            assert out.getvalue() == refquote(s)
+        s = "".join(chr(i) for i in range(256))
+        assert utils.jsquote(s) == refquote(s)
 
     def test_browser(self):
         s = []
@@ -31,9 +73,48 @@ class ujsquote(libpry.AutoTree):
         )
 
 
+class udataquote(libpry.AutoTree):
+    def test_one(self):
+        assert utils.dataquote("") == ""
+        assert utils.dataquote('{"iv":"a+b/c=="}') == 'raw:{"iv":"a+b/c=="}'
+        assert utils.dataquote("</script>") == "base64:PC9zY3JpcHQ+"
+        assert utils.dataquote("a\r\nb") == "base64:YQ0KYg=="
+        assert utils.dataquote("\x00") == "base64:AA=="
+
+    def test_unicode(self):
+        assert utils.dataquote(u"\u00e9") == u"raw:\u00e9"
+        assert utils.dataquote(u"<\u00e9") == "base64:PMOp"
+
+
+class uData(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = utils.Data(__name__)
+        self.data.dirname = self.tmpdir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read(self):
+        p = os.path.join(self.tmpdir, "foo")
+        f = open(p, "w")
+        f.write("one")
+        f.close()
+        a = self.data.read("foo")
+        assert a == "one"
+        assert self.data.read("foo") is a
+        f = open(p, "w")
+        f.write("three")
+        f.close()
+        assert self.data.read("foo") == "three"
+        os.unlink(p)
+        libpry.raises("does not exist", self.data.read, "foo")
+
 
 tests = [
-    ujsquote()
+    ujsquote(),
+    udataquote(),
+    uData(),
 ]
 
 
@@ -0,0 +1,135 @@
+import os, os.path, shutil, tempfile, socket, threading, StringIO, weakref
+import libpry
+from libcrypclient import zerocopy, pad
+import _utils
+
+
+class uZeroCopy(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write(self):
+        segments = ["one", "", "two", "three"]
+        s = zerocopy.write(self.tmpdir, "foo", segments)
+        assert s.offsets == [(0, 3), (3, 0), (3, 3), (6, 5)]
+        assert open(s.path).read() == "onetwothree"
+        mtime = os.path.getmtime(s.path)
+        assert zerocopy.write(self.tmpdir, "foo", segments).path == s.path
+        assert os.path.getmtime(s.path) == mtime
+        f = open(s.path, "wb")
+        f.write("short")
+        f.close()
+        libpry.raises("truncated", zerocopy.Static, s.path, segments)
+
+    def test_send(self):
+        if not zerocopy.sendfile:
+            return
+        s = zerocopy.write(self.tmpdir, "foo", ["one", "two"])
+        p = os.path.join(self.tmpdir, "out")
+        f = open(p, "wb")
+        assert s.send(f.fileno(), 1)
+        assert s.send(f.fileno(), 0)
+        f.close()
+        assert open(p).read() == "twoone"
+        s.close()
+        f = open(p, "wb")
+        assert not s.send(f.fileno(), 0)
+        f.close()
+
+
+class uWrite(libpry.AutoTree):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _file(self, write):
+        p = os.path.join(self.tmpdir, "out")
+        f = open(p, "wb")
+        f.write("x")
+        n = write(f)
+        f.write("y")
+        f.close()
+        ret = open(p, "rb").read()
+        assert n == len(ret) - 2
+        return ret[1:-1]
+
+    def _socket(self, write):
+        a, b = socket.socketpair()
+        ret = []
+        def read():
+            while 1:
+                s = b.recv(65536)
+                if not s:
+                    break
+                ret.append(s)
+        t = threading.Thread(target=read)
+        t.start()
+        write(a)
+        a.close()
+        t.join()
+        b.close()
+        return "".join(ret)
+
+    def _check(self, l, blob):
+        page = l.existing("name", blob)
+        w = lambda out: l.write_existing(out, "name", blob)
+        assert self._file(w) == page
+        def fd(f):
+            f.flush()
+            return w(f.fileno())
+        assert self._file(fd) == page
+        assert self._socket(w) == page
+        # No file descriptor: written from memory.
+        f = StringIO.StringIO()
+        assert w(f) == len(page)
+        assert f.getvalue() == page
+        assert self._file(lambda f: l.write_new(f, "name", "key")) == \
+               l.new("name", "key")
+
+    def test_write(self):
+        blob = "".join(chr(i) for i in range(255))
+        p = pad.Pad("test", True, False)
+        self._check(p, blob)
+        path = p.withDomain("other").writeStatic(self.tmpdir)
+        assert os.path.basename(path).startswith("pad-")
+        l = p.withDomain("other")
+        assert l.static is None
+        l.writeStatic(self.tmpdir)
+        assert l.static.path == path
+        self._check(l, blob)
+        # Writing it again, or relinking, leaves the old file open for
+        # copies that share it, and it's closed once they drop it.
+        o = l.withDomain("other")
+        ref = weakref.ref(o.static)
+        l.writeStatic(self.tmpdir)
+        l.link()
+        assert not o.static.file.closed
+        self._check(o, blob)
+        if zerocopy.sendfile:
+            out = open(os.path.join(self.tmpdir, "out"), "wb")
+            assert o.static.send(out.fileno(), 0)
+            out.close()
+        o.link()
+        assert ref() is None
+        l.writeStatic(self.tmpdir)
+        sendfile = zerocopy.sendfile
+        zerocopy.sendfile = None
+        try:
+            self._check(l, blob)
+        finally:
+            zerocopy.sendfile = sendfile
+        c = pad.Converter("test", True, False)
+        c.writeStatic(self.tmpdir)
+        assert self._socket(lambda s: c.write_render(s, "name", blob)) == \
+               c.render("name", blob)
+
+
+tests = [
+    uZeroCopy(),
+    uWrite(),
+]